@@ -0,0 +1,393 @@
+"""
+本地 GitHub 替身服务器
+
+模拟 GitHubFolderSync 依赖的 REST 接口（commits / git trees / contents / compare /
+tarball）、GraphQL 批量读取 blob 以及 raw 下载，支持可配置的目录规模、延迟、错误率与限流额度，
+用于在不访问真实 GitHub 的情况下测量与回归测试同步性能。
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import tarfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+def git_blob_sha(content: bytes) -> str:
+    """计算 git blob 对象的 SHA1"""
+    return hashlib.sha1(f"blob {len(content)}\0".encode() + content).hexdigest()
+
+
+class FakeRepo:
+    """内存中的仓库，按提交保存完整文件快照"""
+
+    def __init__(self, owner: str = "MaaAssistantArknights", name: str = "MaaAssistantArknights",
+                 branch: str = "dev"):
+        self.owner = owner
+        self.name = name
+        self.branch = branch
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, List[Dict]] = {}
+        self.commits: Dict[str, Dict] = {}
+        self.head: Optional[str] = None
+
+    def _write_tree(self, files: Dict[str, bytes]) -> str:
+        """自底向上构建目录树，返回根树SHA"""
+        children: Dict[str, Dict[str, bytes]] = {}
+        entries = []
+        for path, content in files.items():
+            if "/" in path:
+                head, rest = path.split("/", 1)
+                children.setdefault(head, {})[rest] = content
+            else:
+                sha = git_blob_sha(content)
+                self.blobs[sha] = content
+                entries.append({"path": path, "mode": "100644", "type": "blob",
+                                "sha": sha, "size": len(content)})
+        for name, sub_files in children.items():
+            entries.append({"path": name, "mode": "040000", "type": "tree",
+                            "sha": self._write_tree(sub_files)})
+
+        entries.sort(key=lambda e: e["path"] + ("/" if e["type"] == "tree" else ""))
+        raw = b"".join(f"{'40000' if e['type'] == 'tree' else e['mode']} {e['path']}".encode()
+                       + b"\0" + bytes.fromhex(e["sha"]) for e in entries)
+        sha = hashlib.sha1(f"tree {len(raw)}\0".encode() + raw).hexdigest()
+        self.trees[sha] = entries
+        return sha
+
+    def commit(self, files: Dict[str, bytes]) -> str:
+        """提交一份完整快照并移动分支头"""
+        tree = self._write_tree(files)
+        parent = self.head or ""
+        body = f"tree {tree}\nparent {parent}\n{time.time_ns()}".encode()
+        sha = hashlib.sha1(f"commit {len(body)}\0".encode() + body).hexdigest()
+        self.commits[sha] = {"tree": tree, "files": dict(files), "parent": parent}
+        self.head = sha
+        return sha
+
+    def resolve(self, ref: str) -> Optional[str]:
+        if ref == self.branch:
+            return self.head
+        return ref if ref in self.commits else None
+
+    def flatten(self, tree_sha: str, prefix: str = "") -> List[Dict]:
+        result = []
+        for entry in self.trees[tree_sha]:
+            item = dict(entry, path=f"{prefix}{entry['path']}")
+            result.append(item)
+            if entry["type"] == "tree":
+                result.extend(self.flatten(entry["sha"], f"{item['path']}/"))
+        return result
+
+
+class StubStats:
+    """服务器端观测到的请求统计"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.api_requests = 0
+        self.raw_requests = 0
+        self.not_modified = 0
+        self.injected_errors = 0
+        self.rate_limited = 0
+        self.bytes_sent = 0
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+class GitHubStub:
+    """基于 aiohttp 的 GitHub 替身"""
+
+    def __init__(self, repo: FakeRepo, latency: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: int = 5000, tree_truncate_limit: Optional[int] = None,
+                 seed: int = 0, graphql_nodes_per_point: int = 100, token: Optional[str] = None):
+        self.repo = repo
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.tree_truncate_limit = tree_truncate_limit
+        self.graphql_nodes_per_point = graphql_nodes_per_point
+        # 设置后只接受该 token，其余 API 请求返回 401
+        self.token = token
+        self.random = random.Random(seed)
+        self.stats = StubStats()
+        self.app = self._build_app()
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    # ---- 服务器生命周期 ----
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        sockets = site._server.sockets
+        self.base_url = f"http://{host}:{sockets[0].getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    @property
+    def api_base(self) -> str:
+        return self.base_url
+
+    @property
+    def raw_base(self) -> str:
+        return f"{self.base_url}/raw"
+
+    # ---- 中间件：延迟、错误注入、限流、ETag、计数 ----
+
+    def _build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        prefix = "/repos/{owner}/{repo}"
+        app.router.add_get("/user", self.handle_user)
+        app.router.add_get("/rate_limit", self.handle_rate_limit)
+        app.router.add_get(prefix + "/commits/{ref}", self.handle_commit)
+        app.router.add_get(prefix + "/git/commits/{sha}", self.handle_git_commit)
+        app.router.add_get(prefix + "/git/trees/{sha}", self.handle_tree)
+        app.router.add_get(prefix + "/contents/{path:.*}", self.handle_contents)
+        app.router.add_get(prefix + "/compare/{basehead}", self.handle_compare)
+        app.router.add_get(prefix + "/tarball/{ref}", self.handle_tarball)
+        app.router.add_post("/graphql", self.handle_graphql)
+        app.router.add_get("/raw/{owner}/{repo}/{ref}/{path:.*}", self.handle_raw)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.stats.requests += 1
+        is_raw = request.path.startswith("/raw/")
+        if is_raw:
+            self.stats.raw_requests += 1
+        else:
+            self.stats.api_requests += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats.injected_errors += 1
+            if self.random.random() < 0.5:
+                return web.json_response({"message": "You have exceeded a secondary rate limit."},
+                                         status=403, headers={"Retry-After": "1"})
+            return web.json_response({"message": "Server Error"}, status=502)
+
+        headers = {}
+        if not is_raw:
+            if self.token and request.headers.get("Authorization") != f"token {self.token}":
+                return web.json_response({"message": "Bad credentials"}, status=401)
+            if self.remaining <= 0:
+                self.stats.rate_limited += 1
+                return web.json_response(
+                    {"message": "API rate limit exceeded"}, status=403,
+                    headers=self._rate_headers())
+
+        response = await handler(request)
+
+        if isinstance(response, web.Response) and response.status == 200 and not is_raw:
+            etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.stats.not_modified += 1
+                response = web.Response(status=304)
+            else:
+                self.remaining -= 1
+                response.headers["ETag"] = etag
+        elif not is_raw:
+            self.remaining -= 1
+
+        if not is_raw:
+            headers.update(self._rate_headers())
+        response.headers.update(headers)
+        if isinstance(response, web.Response) and response.body is not None:
+            self.stats.bytes_sent += len(response.body)
+        return response
+
+    def _rate_headers(self) -> Dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": str(self.reset_at),
+        }
+
+    def _check_repo(self, request: web.Request):
+        if (request.match_info["owner"], request.match_info["repo"]) != (self.repo.owner, self.repo.name):
+            raise web.HTTPNotFound()
+
+    def _raw_url(self, ref: str, path: str) -> str:
+        return f"{self.raw_base}/{self.repo.owner}/{self.repo.name}/{ref}/{path}"
+
+    # ---- REST 接口 ----
+
+    async def handle_user(self, request: web.Request):
+        return web.json_response({"login": "bench"})
+
+    async def handle_rate_limit(self, request: web.Request):
+        return web.json_response({"rate": {"limit": self.rate_limit, "remaining": self.remaining,
+                                           "reset": self.reset_at}})
+
+    async def handle_commit(self, request: web.Request):
+        self._check_repo(request)
+        sha = self.repo.resolve(request.match_info["ref"])
+        if not sha:
+            raise web.HTTPNotFound()
+        if "application/vnd.github.sha" in request.headers.get("Accept", ""):
+            return web.Response(text=sha)
+        return web.json_response({"sha": sha, "commit": {"tree": {"sha": self.repo.commits[sha]["tree"]}}})
+
+    async def handle_git_commit(self, request: web.Request):
+        self._check_repo(request)
+        commit = self.repo.commits.get(request.match_info["sha"])
+        if not commit:
+            raise web.HTTPNotFound()
+        return web.json_response({"sha": request.match_info["sha"], "tree": {"sha": commit["tree"]}})
+
+    async def handle_tree(self, request: web.Request):
+        self._check_repo(request)
+        sha = request.match_info["sha"]
+        if sha not in self.repo.trees:
+            raise web.HTTPNotFound()
+        recursive = request.query.get("recursive") not in (None, "", "0", "false")
+        entries = self.repo.flatten(sha) if recursive else [dict(e) for e in self.repo.trees[sha]]
+        truncated = False
+        if recursive and self.tree_truncate_limit and len(entries) > self.tree_truncate_limit:
+            entries = entries[:self.tree_truncate_limit]
+            truncated = True
+        return web.json_response({"sha": sha, "tree": entries, "truncated": truncated})
+
+    async def handle_contents(self, request: web.Request):
+        self._check_repo(request)
+        ref = self.repo.resolve(request.query.get("ref", self.repo.branch))
+        if not ref:
+            raise web.HTTPNotFound()
+        files = self.repo.commits[ref]["files"]
+        path = request.match_info["path"].strip("/")
+        if path in files:
+            content = files[path]
+            return web.json_response({
+                "type": "file", "name": path.rsplit("/", 1)[-1], "path": path,
+                "sha": git_blob_sha(content), "size": len(content), "encoding": "base64",
+                "content": base64.b64encode(content).decode(),
+                "download_url": self._raw_url(ref, path),
+            })
+        listing = {}
+        for file_path, content in files.items():
+            if not file_path.startswith(path + "/"):
+                continue
+            rest = file_path[len(path) + 1:]
+            name = rest.split("/", 1)[0]
+            child = f"{path}/{name}"
+            if "/" in rest:
+                listing[child] = {"type": "dir", "name": name, "path": child, "sha": "",
+                                  "size": 0, "download_url": None}
+            else:
+                listing[child] = {"type": "file", "name": name, "path": child,
+                                  "sha": git_blob_sha(content), "size": len(content),
+                                  "download_url": self._raw_url(ref, child)}
+        if not listing:
+            raise web.HTTPNotFound()
+        return web.json_response(list(listing.values()))
+
+    async def handle_compare(self, request: web.Request):
+        self._check_repo(request)
+        base_ref, _, head_ref = request.match_info["basehead"].partition("...")
+        base, head = self.repo.resolve(base_ref), self.repo.resolve(head_ref)
+        if not base or not head:
+            raise web.HTTPNotFound()
+
+        # 沿父提交链判断 base 是否为 head 的祖先
+        ahead_by, cursor = 0, head
+        while cursor and cursor != base:
+            cursor = self.repo.commits[cursor]["parent"]
+            ahead_by += 1
+        status = "identical" if base == head else ("ahead" if cursor == base else "diverged")
+
+        old, new = self.repo.commits[base]["files"], self.repo.commits[head]["files"]
+        changed = []
+        for path in sorted(set(old) | set(new)):
+            if path not in new:
+                changed.append({"filename": path, "status": "removed", "sha": git_blob_sha(old[path])})
+            elif path not in old:
+                changed.append({"filename": path, "status": "added", "sha": git_blob_sha(new[path])})
+            elif old[path] != new[path]:
+                changed.append({"filename": path, "status": "modified", "sha": git_blob_sha(new[path])})
+        for item in changed:
+            item["raw_url"] = self._raw_url(head, item["filename"])
+        return web.json_response({"status": status, "ahead_by": ahead_by, "behind_by": 0,
+                                  "total_commits": ahead_by, "files": changed[:300]})
+
+    async def handle_graphql(self, request: web.Request):
+        """只支持同步器使用的 repository.object(expression) 查询"""
+        query = (await request.json()).get("query", "")
+        repo = re.search(r'repository\(owner: ("(?:[^"\\]|\\.)*"), name: ("(?:[^"\\]|\\.)*")\)', query)
+        if not repo or (json.loads(repo.group(1)), json.loads(repo.group(2))) != (self.repo.owner, self.repo.name):
+            return web.json_response({"data": {"repository": None},
+                                      "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to a Repository"}]})
+
+        nodes = {}
+        for alias, expression in re.findall(r'(\w+): object\(expression: ("(?:[^"\\]|\\.)*")\)', query):
+            ref, _, path = json.loads(expression).partition(":")
+            sha = self.repo.resolve(ref)
+            content = self.repo.commits[sha]["files"].get(path) if sha else None
+            if content is None:
+                nodes[alias] = None
+                continue
+            try:
+                text = content.decode("utf-8")
+                binary = "\0" in text
+            except UnicodeDecodeError:
+                binary = True
+            nodes[alias] = {"oid": git_blob_sha(content), "byteSize": len(content), "isBinary": binary,
+                            "isTruncated": False, "text": None if binary else text}
+
+        # 按查询的对象数估算成本（中间件已扣除 1 点）
+        cost = max(1, math.ceil(len(nodes) / self.graphql_nodes_per_point))
+        self.remaining -= cost - 1
+        return web.json_response({"data": {"rateLimit": {"cost": cost, "remaining": max(self.remaining - 1, 0)},
+                                           "repository": nodes}})
+
+    async def handle_tarball(self, request: web.Request):
+        self._check_repo(request)
+        ref = self.repo.resolve(request.match_info["ref"])
+        if not ref:
+            raise web.HTTPNotFound()
+
+        buffer = io.BytesIO()
+        root = f"{self.repo.owner}-{self.repo.name}-{ref[:7]}"
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for path, content in self.repo.commits[ref]["files"].items():
+                info = tarfile.TarInfo(f"{root}/{path}")
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-gzip"})
+        await response.prepare(request)
+        data = buffer.getvalue()
+        for offset in range(0, len(data), 64 * 1024):
+            await response.write(data[offset:offset + 64 * 1024])
+        self.stats.bytes_sent += len(data)
+        await response.write_eof()
+        return response
+
+    async def handle_raw(self, request: web.Request):
+        self._check_repo(request)
+        ref = self.repo.resolve(request.match_info["ref"])
+        path = request.match_info["path"]
+        files = self.repo.commits[ref]["files"] if ref else {}
+        if path not in files:
+            raise web.HTTPNotFound()
+        return web.Response(body=files[path], content_type="application/octet-stream")
@@ -0,0 +1,271 @@
+"""
+同步引擎基准测试
+
+在本地启动 GitHub 替身服务器，按场景（冷启动、无变化、少量变更、大量变更）
+运行 github_sync.py 中的 GitHubFolderSync，并报告耗时、请求数、传输字节数与峰值内存。
+
+用法：
+    python bench/run_bench.py
+    python bench/run_bench.py --files 5000 --latency 0.05 --error-rate 0.02 --scenario cold --scenario small-delta
+    python bench/run_bench.py --json bench_output.json
+
+每次测量都在独立子进程中运行同步，以便准确统计峰值内存（RSS）。
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import math
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from github_stub import FakeRepo, GitHubStub
+
+ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ["cold", "noop", "small-delta", "large-delta"]
+
+# 仿照 MAA resource 的目录布局
+BASE_DIRS = ["template", "tasks", "roguelike", "battle_data", "infrast"]
+GLOBAL_REGIONS = ["YoStarEN", "YoStarJP", "YoStarKR", "txwy"]
+
+
+def load_sync_module():
+    """按路径加载仓库根目录下的 github_sync.py"""
+    spec = importlib.util.spec_from_file_location("github_sync", ROOT / "github_sync.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB），不支持的平台返回 0"""
+    # Linux 的 ru_maxrss 会跨 execve 继承父进程的峰值，优先读取 VmHWM
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ---- 生成测试仓库 ----
+
+def random_size(rng: random.Random, args) -> int:
+    """对数正态分布的文件大小，限制在 [1, max_size]"""
+    size = int(rng.lognormvariate(math.log(args.median_size), args.size_sigma))
+    return max(1, min(size, args.max_size))
+
+
+def random_content(rng: random.Random, path: str, size: int) -> bytes:
+    if path.endswith(".png"):
+        return rng.randbytes(size)
+    line = f'{{"path": "{path}", "value": {rng.random()}}}\n'.encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+def generate_files(args) -> Dict[str, bytes]:
+    rng = random.Random(args.seed)
+    files = {"resource/version.json": b'{"activity": {"name": "bench"}, "last_updated": "0"}'}
+    base_paths = []
+
+    for i in range(args.files):
+        if rng.random() < 0.6:
+            folder = f"resource/{rng.choice(BASE_DIRS)}"
+        else:
+            folder = f"resource/global/{rng.choice(GLOBAL_REGIONS)}/resource/{rng.choice(BASE_DIRS)}"
+        folder += f"/group{rng.randrange(args.dir_fanout)}"
+        extension = ".png" if rng.random() < args.binary_ratio else ".json"
+        path = f"{folder}/file{i}{extension}"
+        # 各服务器的覆盖目录中有不少与国服完全相同的文件
+        if "/global/" in path and base_paths and rng.random() < args.dup_ratio:
+            files[path] = files[rng.choice(base_paths)]
+            continue
+        files[path] = random_content(rng, path, random_size(rng, args))
+        if "/global/" not in path:
+            base_paths.append(path)
+
+    # 目标文件夹之外的文件，用于确认同步只关注 resource/
+    files["README.md"] = b"# bench"
+    files["src/main.cpp"] = b"int main() {}"
+    return files
+
+
+def mutate_files(files: Dict[str, bytes], count: int, args, seed: int) -> Dict[str, bytes]:
+    """修改、新增、删除约 count 个文件并更新 version.json"""
+    rng = random.Random(seed)
+    result = dict(files)
+    candidates = sorted(path for path in files if path.startswith("resource/") and "version.json" not in path)
+
+    for path in rng.sample(candidates, min(count, len(candidates))):
+        action = rng.random()
+        if action < 0.7:
+            result[path] = random_content(rng, path, random_size(rng, args))
+        elif action < 0.85:
+            del result[path]
+        else:
+            new_path = path.rsplit("/", 1)[0] + f"/added{rng.randrange(10 ** 9)}.json"
+            result[new_path] = random_content(rng, new_path, random_size(rng, args))
+
+    result["resource/version.json"] = f'{{"last_updated": "{seed}"}}'.encode()
+    return result
+
+
+# ---- 子进程中执行同步 ----
+
+def run_worker(args):
+    """子进程入口：执行一次同步并以 JSON 输出测量结果"""
+    logging.disable(logging.CRITICAL if args.quiet else logging.NOTSET)
+    module = load_sync_module()
+    syncer = module.GitHubFolderSync("bench-token", args.path, api_base=args.api_base, raw_base=args.raw_base)
+
+    start = time.perf_counter()
+    syncer.run_sync()
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "wall_time": wall,
+        "stats": syncer.stats,
+        "retries": syncer.scheduler.retries,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+async def run_sync_process(stub: GitHubStub, path: Path, quiet: bool = True) -> Dict:
+    command = [sys.executable, str(Path(__file__).resolve()), "worker",
+               "--path", str(path), "--api-base", stub.api_base, "--raw-base", stub.raw_base]
+    if quiet:
+        command.append("--quiet")
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"同步子进程退出码 {process.returncode}")
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+# ---- 场景 ----
+
+async def run_scenario(name: str, args, workdir: Path) -> Dict:
+    files = generate_files(args)
+    repo = FakeRepo()
+    repo.commit(files)
+    stub = GitHubStub(repo, latency=args.latency, error_rate=0.0, rate_limit=args.rate_limit,
+                      tree_truncate_limit=args.truncate, seed=args.seed)
+    await stub.start()
+    path = workdir / name
+
+    try:
+        # 非冷启动场景先完成一次同步作为初始状态（不计入测量）
+        if name != "cold":
+            await run_sync_process(stub, path)
+
+        if name == "small-delta":
+            repo.commit(mutate_files(files, args.small_delta, args, seed=1))
+        elif name == "large-delta":
+            repo.commit(mutate_files(files, int(len(files) * args.large_delta), args, seed=2))
+
+        stub.stats.reset()
+        stub.error_rate = args.error_rate
+        result = await run_sync_process(stub, path, quiet=not args.verbose)
+    finally:
+        await stub.stop()
+
+    # 校验同步结果与远程快照完全一致
+    expected = {p[len("resource/"):]: c for p, c in repo.commits[repo.head]["files"].items()
+                if p.startswith("resource/")}
+    mismatched = sum(1 for rel, content in expected.items()
+                     if not (path / rel).is_file() or (path / rel).read_bytes() != content)
+
+    return {
+        "scenario": name,
+        "wall_time": round(result["wall_time"], 3),
+        "requests": stub.stats.requests,
+        "api_requests": stub.stats.api_requests,
+        "raw_requests": stub.stats.raw_requests,
+        "not_modified": stub.stats.not_modified,
+        "bytes_sent": stub.stats.bytes_sent,
+        "retries": result["retries"],
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+        "downloaded": result["stats"]["downloaded"],
+        "reused": result["stats"]["reused"],
+        "failed": result["stats"]["failed"],
+        "mismatched": mismatched,
+    }
+
+
+def print_table(results: List[Dict]):
+    columns = ["scenario", "wall_time", "requests", "api_requests", "raw_requests", "not_modified",
+               "bytes_sent", "retries", "peak_rss_mb", "downloaded", "reused", "failed", "mismatched"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(widths[c]) for c in columns))
+
+
+async def run_bench(args):
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="maa-sync-bench-"))
+    results = []
+    try:
+        for name in args.scenario or SCENARIOS:
+            results.append(await run_scenario(name, args, workdir))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"config": vars(args), "results": results}, indent=2),
+                                   encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHubFolderSync 基准测试")
+    subparsers = parser.add_subparsers(dest="command")
+
+    worker = subparsers.add_parser("worker", help=argparse.SUPPRESS)
+    worker.add_argument("--path", required=True)
+    worker.add_argument("--api-base", required=True)
+    worker.add_argument("--raw-base", required=True)
+    worker.add_argument("--quiet", action="store_true")
+
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="要运行的场景，可重复；默认全部")
+    parser.add_argument("--files", type=int, default=2000, help="resource/ 下的文件数")
+    parser.add_argument("--dir-fanout", type=int, default=20, help="每个分类下的子目录数")
+    parser.add_argument("--median-size", type=int, default=2048, help="文件大小中位数（字节）")
+    parser.add_argument("--size-sigma", type=float, default=1.5, help="文件大小对数正态分布的 sigma")
+    parser.add_argument("--max-size", type=int, default=4 * 1024 * 1024, help="单个文件大小上限（字节）")
+    parser.add_argument("--dup-ratio", type=float, default=0.3, help="global/ 下与国服文件内容相同的比例")
+    parser.add_argument("--binary-ratio", type=float, default=0.4, help="二进制（.png）文件比例")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机注入 403/502 错误的比例")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="API 限流额度")
+    parser.add_argument("--truncate", type=int, default=None, help="递归目录树超过该条目数时截断")
+    parser.add_argument("--small-delta", type=int, default=20, help="small-delta 场景变更的文件数")
+    parser.add_argument("--large-delta", type=float, default=0.3, help="large-delta 场景变更的文件比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="同步目标所在目录，默认使用临时目录")
+    parser.add_argument("--keep", action="store_true", help="保留同步结果目录")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="输出被测同步的日志")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args)
+    else:
+        asyncio.run(run_bench(args))
+
+
+if __name__ == "__main__":
+    main()
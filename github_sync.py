@@ -0,0 +1,3178 @@
+from __future__ import annotations
+
+import os
+import argparse
+import sys
+import io
+import json
+import asyncio
+import importlib
+from pathlib import Path
+from http.client import HTTPException
+from urllib.error import HTTPError
+from urllib.parse import quote, urlencode, urlsplit
+from urllib.request import Request, urlopen
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+import hashlib
+import base64
+import tarfile
+from fnmatch import fnmatchcase
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
+import mmap
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from dotenv import load_dotenv, set_key
+
+class LazyModule:
+    """第一次访问属性时才导入的模块"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# aiohttp导入耗时较长，无需更新时用不到，推迟到真正需要同步时再导入
+aiohttp = LazyModule("aiohttp")
+web = LazyModule("aiohttp.web")
+aiofiles = LazyModule("aiofiles")
+
+# 日志配置由命令行入口完成，作为库导入时不修改调用方的日志设置
+logger = logging.getLogger(__name__)
+
+# 默认的GitHub API与原始文件地址，可通过环境变量 GITHUB_API_BASE / GITHUB_RAW_BASE 覆盖
+DEFAULT_API_BASE = "https://api.github.com"
+DEFAULT_RAW_BASE = "https://raw.githubusercontent.com"
+
+# 流式下载与哈希时每次处理的块大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 待下载文件数同时达到下列阈值时，改为解压仓库归档
+BOOTSTRAP_MIN_FILES = 500
+BOOTSTRAP_RATIO = 0.5
+
+# HTTP校验缓存条目超过该天数未使用时丢弃
+HTTP_CACHE_EXPIRE_DAYS = 7
+
+# 快速版本检查的超时（秒）
+QUICK_CHECK_TIMEOUT = 10
+
+# 记录token有效性与限流余量的缓存文件（与.env位于同一目录，只保存token的哈希）
+TOKEN_CACHE_FILE = ".sync_token_cache.json"
+
+# 常驻模式默认的轮询间隔（秒）、间隔抖动比例与本地监听地址
+DAEMON_INTERVAL = 600
+DAEMON_JITTER = 0.2
+DAEMON_LISTEN = "127.0.0.1:8731"
+
+# 请求延迟直方图的分桶上界（秒）与指标报告文件名
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+METRICS_JSON_FILE = ".sync_metrics.json"
+METRICS_PROM_FILE = ".sync_metrics.prom"
+
+# 镜像模式保留的提交快照数，用于响应compare请求
+MIRROR_HISTORY = 8
+
+# 镜像通过contents接口提供的文件大小上限（与GitHub一致）
+MIRROR_CONTENTS_LIMIT = 1024 * 1024
+
+# 校验模式每批交给工作进程的文件数与字节数上限，以及超过该大小的文件改用mmap读取
+VERIFY_BATCH_FILES = 256
+VERIFY_BATCH_BYTES = 8 * 1024 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+
+# 校验报告中每类问题最多列出的路径数
+VERIFY_REPORT_LIMIT = 50
+
+# 内容寻址对象库目录（位于本地存储路径下，以便与资源文件建立硬链接）
+OBJECT_STORE_DIR = ".sync_objects"
+# 对象库中记录各对象写入时指纹的索引文件
+OBJECT_INDEX_FILE = "objects.db"
+
+# compare API 最多返回300个变更文件，达到上限时无法确认变更是否完整
+COMPARE_FILE_LIMIT = 300
+
+# 请求调度器的并发范围（按主机分别调整）
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 20
+
+# 同时进行中的下载总字节数上限，以及下载工作协程数（实际并发仍由请求调度器按主机控制）
+DOWNLOAD_BYTES_IN_FLIGHT = 32 * 1024 * 1024
+DOWNLOAD_WORKERS = MAX_CONCURRENCY
+
+# 通过GraphQL批量获取的文本文件：扩展名、单个文件大小上限与最少文件数
+GRAPHQL_TEXT_EXTENSIONS = {".json", ".txt", ".yaml", ".yml", ".md", ".csv", ".xml", ".lua"}
+GRAPHQL_TEXT_LIMIT = 100 * 1024
+GRAPHQL_MIN_FILES = 4
+# GraphQL每次查询的文件数（按查询成本自适应）、目标成本与同时进行的查询数
+GRAPHQL_INITIAL_BATCH = 50
+GRAPHQL_MAX_BATCH = 250
+GRAPHQL_TARGET_COST = 1
+GRAPHQL_CONCURRENCY = 4
+# GraphQL剩余额度低于该值时不再使用，改为逐个下载
+GRAPHQL_MIN_REMAINING = 100
+
+# 作为提交标记的元数据文件，在其他文件全部成功后最后写入
+COMMIT_MARKER_FILES = {"version.json"}
+
+# 失败请求的最大重试次数与退避上限（秒）
+MAX_RETRIES = 5
+MAX_BACKOFF = 60
+# 限流重置时间超过该秒数时不再等待，直接报错
+MAX_RATE_LIMIT_WAIT = 300
+# 请求延迟超过最佳延迟的该倍数时视为拥塞，降低并发
+LATENCY_TOLERANCE = 3
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class GitHubRequestError(Exception):
+    """GitHub请求在重试后仍然失败"""
+    
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+class HostState:
+    """单个主机的并发窗口与限流状态"""
+    
+    def __init__(self):
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.best_latency: Optional[float] = None
+        self.rate_remaining: Optional[int] = None
+        self.rate_reset: Optional[int] = None
+
+class RequestScheduler:
+    """集中调度所有HTTP请求
+    
+    按主机维护并发窗口：成功时缓慢扩大，遇到限流、服务端错误或延迟明显升高时减半；
+    根据 X-RateLimit-* 与 Retry-After 暂停该主机的新请求，失败时按带抖动的指数退避重试
+    """
+    
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.hosts: Dict[str, HostState] = {}
+        self.condition: Optional[asyncio.Condition] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.retries = 0
+    
+    def get_condition(self) -> asyncio.Condition:
+        # 条件变量绑定事件循环，每次 asyncio.run 都要重新创建
+        loop = asyncio.get_running_loop()
+        if self.condition is None or self.loop is not loop:
+            self.condition = asyncio.Condition()
+            self.loop = loop
+            for state in self.hosts.values():
+                state.in_flight = 0
+        return self.condition
+    
+    async def acquire(self, host: str) -> HostState:
+        state = self.hosts.setdefault(host, HostState())
+        condition = self.get_condition()
+        
+        async with condition:
+            await condition.wait_for(lambda: state.in_flight < int(state.limit))
+            state.in_flight += 1
+        
+        # 该主机处于限流暂停期时等待
+        delay = state.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return state
+    
+    async def release(self, state: HostState):
+        condition = self.get_condition()
+        async with condition:
+            state.in_flight -= 1
+            condition.notify_all()
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """带完全抖动的指数退避"""
+        return random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+    
+    def observe(self, state: HostState, response: aiohttp.ClientResponse, latency: float):
+        """根据响应头与延迟调整该主机的并发窗口"""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            state.rate_remaining = int(remaining)
+            state.rate_reset = int(reset)
+        
+        if response.status in RETRY_STATUSES or response.status == 403:
+            state.limit = max(MIN_CONCURRENCY, state.limit / 2)
+            return
+        
+        if state.best_latency is None or latency < state.best_latency:
+            state.best_latency = latency
+        
+        if latency > state.best_latency * LATENCY_TOLERANCE and latency > 0.5:
+            state.limit = max(MIN_CONCURRENCY, state.limit * 0.9)
+        else:
+            state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+    
+    def retry_delay(self, state: HostState, response: aiohttp.ClientResponse,
+                    attempt: int) -> Optional[float]:
+        """返回重试前需要等待的秒数，不可重试时返回None"""
+        retry_after = response.headers.get("Retry-After")
+        rate_exhausted = response.headers.get("X-RateLimit-Remaining") == "0"
+        
+        # 403 只有在限流时才可重试，其余为权限错误
+        if response.status == 403 and not (retry_after or rate_exhausted):
+            return None
+        if response.status != 403 and response.status not in RETRY_STATUSES:
+            return None
+        
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        elif rate_exhausted and state.rate_reset:
+            delay = max(0.0, state.rate_reset - time.time()) + 1
+        else:
+            return self.backoff_delay(attempt)
+        
+        # 限流期间暂停该主机的所有新请求（等待过久时由调用方直接报错）
+        if delay <= MAX_RATE_LIMIT_WAIT:
+            state.paused_until = max(state.paused_until, time.monotonic() + delay)
+        return delay
+    
+    @asynccontextmanager
+    async def request(self, session: aiohttp.ClientSession, method: str, url: str, **kwargs):
+        """发送请求并在限流、服务端错误或网络错误时自动重试，产出最终响应"""
+        host = urlsplit(url).netloc
+        attempt = 0
+        
+        while True:
+            state = await self.acquire(host)
+            start = time.monotonic()
+            try:
+                response = await session.request(method, url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await self.release(state)
+                state.limit = max(MIN_CONCURRENCY, state.limit / 2)
+                if attempt >= MAX_RETRIES:
+                    raise GitHubRequestError(f"请求失败 {url}: {e!r}") from e
+                delay = self.backoff_delay(attempt)
+            else:
+                self.observe(state, response, time.monotonic() - start)
+                delay = self.retry_delay(state, response, attempt)
+                
+                if delay is None:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                        await self.release(state)
+                    return
+                
+                response.release()
+                await self.release(state)
+                if attempt >= MAX_RETRIES or delay > MAX_RATE_LIMIT_WAIT:
+                    raise GitHubRequestError(f"请求失败 {url}: {response.status}", response.status)
+            
+            attempt += 1
+            self.retries += 1
+            logger.warning(f"请求失败，{delay:.1f} 秒后重试 ({attempt}/{MAX_RETRIES}): {url}")
+            await asyncio.sleep(delay)
+
+class DownloadPlanner:
+    """按文件大小安排下载顺序，并限制同时进行中的字节数
+    
+    待下载内容按大小排序：优先开始最大的文件以缩短尾部耗时，字节预算不足时
+    从最小的一端取文件填补空闲的并发；单个文件超过预算时在没有其他下载时单独进行
+    """
+    
+    def __init__(self, items: List[Tuple[str, int]], budget: int = DOWNLOAD_BYTES_IN_FLIGHT):
+        self.queue = deque(sorted(items, key=lambda item: item[1], reverse=True))
+        self.budget = budget
+        self.in_flight = 0
+        self.active = 0
+        self.peak_in_flight = 0
+        self.condition = asyncio.Condition()
+    
+    def fits(self, size: int) -> bool:
+        return self.active == 0 or self.in_flight + size <= self.budget
+    
+    def take(self) -> Optional[Tuple[str, int]]:
+        if self.fits(self.queue[0][1]):
+            return self.queue.popleft()
+        if self.fits(self.queue[-1][1]):
+            return self.queue.pop()
+        return None
+    
+    async def acquire(self) -> Optional[Tuple[str, int]]:
+        """取出下一个可以开始的内容，队列为空时返回None"""
+        async with self.condition:
+            while True:
+                if not self.queue:
+                    return None
+                item = self.take()
+                if item is not None:
+                    break
+                await self.condition.wait()
+            self.in_flight += item[1]
+            self.active += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return item
+    
+    async def release(self, size: int):
+        async with self.condition:
+            self.in_flight -= size
+            self.active -= 1
+            self.condition.notify_all()
+    
+    async def run(self, worker, workers: int = DOWNLOAD_WORKERS):
+        """以固定数量的工作协程依次处理队列，避免一次创建大量协程"""
+        async def loop():
+            while (item := await self.acquire()) is not None:
+                try:
+                    await worker(item[0])
+                finally:
+                    await self.release(item[1])
+        
+        await asyncio.gather(*(loop() for _ in range(min(workers, len(self.queue)))))
+
+def new_blob_hasher(size: int):
+    """创建已写入git blob头部的SHA1对象"""
+    hasher = hashlib.sha1()
+    hasher.update(f"blob {size}\0".encode())
+    return hasher
+
+def git_blob_sha(file_path: str) -> str:
+    """计算文件的git blob SHA，大文件使用mmap，其余分块读取，避免整个文件载入内存"""
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        hasher = new_blob_hasher(size)
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+        else:
+            while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+def hash_file_batch(file_paths: List[str]) -> List[Optional[str]]:
+    """在工作进程中计算一批文件的git blob SHA，读取失败的文件返回None"""
+    result = []
+    for file_path in file_paths:
+        try:
+            result.append(git_blob_sha(file_path))
+        except OSError:
+            result.append(None)
+    return result
+
+def scan_tree(root: Path) -> Dict[str, int]:
+    """用os.scandir遍历目录树，返回相对路径与文件大小（跳过顶层的同步状态文件）"""
+    files = {}
+    stack = [("", str(root))]
+    while stack:
+        prefix, directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not prefix and entry.name.startswith(".sync_"):
+                    continue
+                relative_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((f"{relative_path}/", entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    files[relative_path] = entry.stat(follow_symlinks=False).st_size
+    return files
+
+class AsyncStreamReader(io.RawIOBase):
+    """在工作线程中以同步方式读取aiohttp响应流"""
+    
+    def __init__(self, stream: aiohttp.StreamReader, loop: asyncio.AbstractEventLoop):
+        self.stream = stream
+        self.loop = loop
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = asyncio.run_coroutine_threadsafe(self.stream.read(len(buffer)), self.loop).result()
+        buffer[:len(data)] = data
+        return len(data)
+
+class SyncMetrics:
+    """收集同步各阶段耗时与请求级指标，输出JSON报告与Prometheus文本文件"""
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """清空上一次同步的指标（常驻模式下每轮同步前调用）"""
+        self.phases: Dict[str, float] = {}
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.exceptions: Dict[str, int] = {}
+        self.latency_buckets: Dict[str, List[int]] = {}
+        self.latency_sum: Dict[str, float] = {}
+        self.latency_count: Dict[str, int] = {}
+        self.bytes_received: Dict[str, int] = {}
+        self.rate_limit: Optional[int] = None
+        self.rate_remaining: Optional[int] = None
+    
+    @contextmanager
+    def phase(self, name: str):
+        """累计一个阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+    
+    def create_trace_config(self) -> aiohttp.TraceConfig:
+        """创建记录请求延迟、状态码、字节数与限流余量的aiohttp钩子"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self.on_request_start)
+        trace_config.on_request_end.append(self.on_request_end)
+        trace_config.on_request_exception.append(self.on_request_exception)
+        trace_config.on_response_chunk_received.append(self.on_response_chunk_received)
+        return trace_config
+    
+    async def on_request_start(self, session, context, params):
+        context.start = time.perf_counter()
+    
+    async def on_request_end(self, session, context, params):
+        self.record_request(params.url.host, params.response.status,
+                            time.perf_counter() - context.start, params.response.headers)
+    
+    def record_request(self, host: str, status: int, latency: float, headers):
+        """记录一次请求的状态码、延迟与限流余量"""
+        self.requests[(host, status)] = self.requests.get((host, status), 0) + 1
+        buckets = self.latency_buckets.setdefault(host, [0] * len(LATENCY_BUCKETS))
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                buckets[index] += 1
+        self.latency_sum[host] = self.latency_sum.get(host, 0.0) + latency
+        self.latency_count[host] = self.latency_count.get(host, 0) + 1
+        
+        if "X-RateLimit-Remaining" in headers:
+            self.rate_remaining = int(headers["X-RateLimit-Remaining"])
+            self.rate_limit = int(headers.get("X-RateLimit-Limit", 0))
+    
+    async def on_request_exception(self, session, context, params):
+        host = params.url.host
+        self.exceptions[host] = self.exceptions.get(host, 0) + 1
+    
+    async def on_response_chunk_received(self, session, context, params):
+        host = params.url.host
+        self.bytes_received[host] = self.bytes_received.get(host, 0) + len(params.chunk)
+    
+    def build_report(self, stats: Dict, scheduler: "RequestScheduler", success: bool) -> Dict:
+        total_bytes = sum(self.bytes_received.values())
+        download_seconds = self.phases.get("download", 0.0)
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "success": success,
+            "stats": stats,
+            "phases": {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            "requests": [
+                {"host": host, "status": status, "count": count}
+                for (host, status), count in sorted(self.requests.items())
+            ],
+            "request_exceptions": self.exceptions,
+            "latency": {
+                host: {
+                    "count": self.latency_count[host],
+                    "sum": round(self.latency_sum[host], 4),
+                    "buckets": dict(zip((str(b) for b in LATENCY_BUCKETS), buckets))
+                }
+                for host, buckets in self.latency_buckets.items()
+            },
+            "bytes_received": self.bytes_received,
+            "download_bytes_per_second": round(total_bytes / download_seconds, 1) if download_seconds else 0,
+            "retries": scheduler.retries,
+            "rate_limit": {"limit": self.rate_limit, "remaining": self.rate_remaining}
+        }
+    
+    def build_prometheus(self, report: Dict) -> str:
+        def escape(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+        
+        lines = []
+        
+        def metric(name: str, metric_type: str, help_text: str, samples: List[Tuple[str, object]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+        
+        metric("maa_sync_last_run_timestamp_seconds", "gauge", "Unix time of the last sync run.",
+               [("", int(time.time()))])
+        metric("maa_sync_last_run_success", "gauge", "Whether the last sync run finished without failures.",
+               [("", int(report["success"]))])
+        metric("maa_sync_phase_seconds", "gauge", "Duration of each phase of the last sync run.",
+               [(f'{{phase="{escape(p)}"}}', v) for p, v in report["phases"].items()])
+        metric("maa_sync_files", "gauge", "File counts of the last sync run.",
+               [(f'{{result="{escape(k)}"}}', v) for k, v in report["stats"].items()])
+        metric("maa_sync_requests", "gauge", "HTTP responses received in the last sync run.",
+               [(f'{{host="{escape(r["host"])}",status="{r["status"]}"}}', r["count"]) for r in report["requests"]])
+        metric("maa_sync_request_exceptions", "gauge", "HTTP requests that raised in the last sync run.",
+               [(f'{{host="{escape(h)}"}}', v) for h, v in self.exceptions.items()])
+        
+        lines.append("# HELP maa_sync_request_duration_seconds Time to response headers in the last sync run.")
+        lines.append("# TYPE maa_sync_request_duration_seconds histogram")
+        for host, buckets in self.latency_buckets.items():
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'maa_sync_request_duration_seconds_bucket{{host="{escape(host)}",le="{bound}"}} {count}')
+            lines.append(f'maa_sync_request_duration_seconds_bucket{{host="{escape(host)}",le="+Inf"}} '
+                         f'{self.latency_count[host]}')
+            lines.append(f'maa_sync_request_duration_seconds_sum{{host="{escape(host)}"}} {self.latency_sum[host]}')
+            lines.append(f'maa_sync_request_duration_seconds_count{{host="{escape(host)}"}} {self.latency_count[host]}')
+        
+        metric("maa_sync_response_bytes", "gauge", "Response body bytes received in the last sync run.",
+               [(f'{{host="{escape(h)}"}}', v) for h, v in self.bytes_received.items()])
+        metric("maa_sync_download_bytes_per_second", "gauge", "Average throughput of the download phase.",
+               [("", report["download_bytes_per_second"])])
+        metric("maa_sync_retries", "gauge", "Requests retried in the last sync run.",
+               [("", report["retries"])])
+        if self.rate_remaining is not None:
+            metric("maa_sync_ratelimit_remaining", "gauge", "GitHub API rate-limit headroom after the last run.",
+                   [("", self.rate_remaining)])
+            metric("maa_sync_ratelimit_limit", "gauge", "GitHub API rate-limit budget.",
+                   [("", self.rate_limit)])
+        return "\n".join(lines) + "\n"
+    
+    def write_reports(self, directory: Path, stats: Dict, scheduler: "RequestScheduler", success: bool):
+        """写入JSON报告与Prometheus文本文件（先写临时文件再替换，避免被读到半个文件）"""
+        try:
+            report = self.build_report(stats, scheduler, success)
+            outputs = {
+                directory / METRICS_JSON_FILE: json.dumps(report, indent=2, ensure_ascii=False),
+                directory / METRICS_PROM_FILE: self.build_prometheus(report)
+            }
+            directory.mkdir(parents=True, exist_ok=True)
+            for path, content in outputs.items():
+                temp_path = path.with_name(f"{path.name}.tmp")
+                temp_path.write_text(content, encoding="utf-8")
+                os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"写入指标报告失败: {e}")
+
+class SyncIndex:
+    """同步索引，记录每个已同步文件的SHA与stat指纹
+    
+    使用WAL模式的SQLite，每个文件完成时立即提交，同步中断后已完成的文件不会丢失；
+    按需查询而不是整体加载，可按路径前缀检索
+    """
+    
+    def __init__(self, db_path: Path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, sha TEXT, size INTEGER, last_modified TEXT, stat TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_sha ON files (sha)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+    
+    def close(self):
+        self.conn.close()
+    
+    def get(self, path: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT sha, size, last_modified, stat FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "sha": row[0],
+            "size": row[1],
+            "last_modified": row[2],
+            "stat": json.loads(row[3]) if row[3] else None
+        }
+    
+    def put(self, path: str, entry: Dict):
+        self.put_many({path: entry})
+    
+    def put_many(self, entries: Dict[str, Dict]):
+        """在一个事务中写入多条记录"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, sha, size, last_modified, stat) VALUES (?, ?, ?, ?, ?)",
+                [(path, entry.get("sha"), entry.get("size"), entry.get("last_modified"),
+                  json.dumps(entry["stat"]) if entry.get("stat") else None)
+                 for path, entry in entries.items()]
+            )
+    
+    def remove(self, path: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+    
+    def paths(self, prefix: str = "") -> Set[str]:
+        """返回以指定前缀开头的所有路径"""
+        if not prefix:
+            rows = self.conn.execute("SELECT path FROM files")
+        else:
+            # 使用范围查询以便命中主键索引
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            rows = self.conn.execute(
+                "SELECT path FROM files WHERE path >= ? AND path < ?", (prefix, upper)
+            )
+        return {row[0] for row in rows}
+    
+    def entries(self, prefix: str = "") -> Dict[str, Dict]:
+        """返回以指定前缀开头的所有路径及其SHA与大小"""
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else "\U0010ffff"
+        rows = self.conn.execute(
+            "SELECT path, sha, size FROM files WHERE path >= ? AND path < ?", (prefix, upper)
+        )
+        return {row[0]: {"sha": row[1], "size": row[2]} for row in rows}
+    
+    def backup(self, db_path: Path):
+        """将索引完整复制到新的数据库文件"""
+        destination = sqlite3.connect(db_path)
+        try:
+            self.conn.backup(destination)
+        finally:
+            destination.close()
+    
+    def find_by_sha(self, sha: str) -> Dict[str, Dict]:
+        """返回内容为指定SHA的所有路径及其记录"""
+        rows = self.conn.execute(
+            "SELECT path, size, last_modified, stat FROM files WHERE sha = ?", (sha,)
+        )
+        return {
+            row[0]: {
+                "sha": sha,
+                "size": row[1],
+                "last_modified": row[2],
+                "stat": json.loads(row[3]) if row[3] else None
+            }
+            for row in rows
+        }
+    
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_meta(self, key: str, value: str):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+    
+    def delete_meta(self, key: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+
+def link_or_copy(source: Path, target: Path):
+    """优先创建硬链接，文件系统不支持或跨设备时退回复制"""
+    if os.path.lexists(target):
+        os.unlink(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class BlobStore:
+    """按git blob SHA寻址的对象库
+    
+    每个不同的内容只保存一份，通过硬链接放置到所有引用它的路径，不支持硬链接时退回复制；
+    对象只在SHA校验通过后写入，同时记录大小与修改时间。与对象共享inode的文件被就地修改时
+    对象随之改变，指纹不再一致的对象视为不存在，之后重新获取
+    """
+    
+    def __init__(self, root: Path):
+        self.root = root
+        self.conn: Optional[sqlite3.Connection] = None
+        # 归档在工作线程中解压写入对象，指纹索引的访问需要加锁
+        self.lock = threading.Lock()
+    
+    def execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """在指纹索引上执行一条语句，首次使用时打开索引"""
+        with self.lock:
+            if self.conn is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self.conn = sqlite3.connect(self.root / OBJECT_INDEX_FILE, check_same_thread=False)
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS objects (sha TEXT PRIMARY KEY, size INTEGER, mtime INTEGER)"
+                )
+            with self.conn:
+                return self.conn.execute(sql, params).fetchall()
+    
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+    
+    def object_path(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha[2:]
+    
+    def temp_path(self, sha: str) -> Path:
+        """写入中的对象临时文件，与对象位于同一目录以便原子替换"""
+        path = self.object_path(sha)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path.with_name(f"{path.name}.part")
+    
+    def has(self, sha: str, size: Optional[int] = None) -> bool:
+        """对象是否存在且写入后未被改动（已知大小时一并核对）"""
+        try:
+            st = os.stat(self.object_path(sha))
+        except FileNotFoundError:
+            return False
+        if size is not None and st.st_size != size:
+            return False
+        # 没有指纹记录的对象（旧版本写入）同样不可信
+        return bool(self.execute("SELECT 1 FROM objects WHERE sha = ? AND size = ? AND mtime = ?",
+                                 (sha, st.st_size, st.st_mtime_ns)))
+    
+    def commit(self, temp_path: Path, sha: str):
+        """将内容已校验的临时文件原子移入对象库，并记录其指纹"""
+        path = self.object_path(sha)
+        os.replace(temp_path, path)
+        st = os.stat(path)
+        self.execute("INSERT OR REPLACE INTO objects (sha, size, mtime) VALUES (?, ?, ?)",
+                     (sha, st.st_size, st.st_mtime_ns))
+    
+    def add_bytes(self, sha: str, content: bytes):
+        """将已校验的内容写入对象库"""
+        temp_path = self.temp_path(sha)
+        temp_path.write_bytes(content)
+        self.commit(temp_path, sha)
+    
+    def add_file(self, source: Path, sha: str):
+        """将内容已确认的本地文件加入对象库"""
+        temp_path = self.temp_path(sha)
+        link_or_copy(source, temp_path)
+        self.commit(temp_path, sha)
+    
+    def place(self, sha: str, target: Path):
+        """将对象放置到目标路径，原子替换已有文件"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_name(f".{target.name}.part")
+        link_or_copy(self.object_path(sha), temp_path)
+        os.replace(temp_path, target)
+    
+    def discard(self, sha: str, fingerprint: List[int]):
+        """本地文件被就地修改时，与其共享inode的对象也随之改变，需要丢弃"""
+        path = self.object_path(sha)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        if [st.st_ino, st.st_dev] == fingerprint[2:4]:
+            path.unlink()
+    
+    def gc(self) -> int:
+        """删除不再被任何路径引用（只剩对象库自身链接）的对象及残留的临时文件
+        
+        清理只是为了节省空间，单个对象无法删除（如在Windows上正被镜像客户端读取）时跳过
+        """
+        if not self.root.exists():
+            return 0
+        
+        removed = 0
+        kept = set()
+        complete = True
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(directory.path))
+            except OSError as e:
+                logger.warning(f"无法读取对象库目录 {directory.path}: {e}")
+                complete = False
+                continue
+            for entry in entries:
+                try:
+                    # Windows上DirEntry.stat()不提供链接数，需要单独stat
+                    if entry.name.endswith(".part") or os.stat(entry.path).st_nlink <= 1:
+                        os.unlink(entry.path)
+                        removed += 1
+                        continue
+                except OSError as e:
+                    logger.warning(f"清理对象失败 {entry.path}: {e}")
+                kept.add(directory.name + entry.name)
+        
+        if not complete:
+            return removed
+        # 同时清除已不存在的对象的指纹记录
+        stale = [(sha,) for sha, in self.execute("SELECT sha FROM objects") if sha not in kept]
+        if stale:
+            with self.lock:
+                with self.conn:
+                    self.conn.executemany("DELETE FROM objects WHERE sha = ?", stale)
+        return removed
+
+class PathFilter:
+    """按glob规则筛选目标文件夹内的路径
+    
+    规则以 "/" 分隔，从目标文件夹开始逐级匹配（每级可用 * ? [] 通配，* 不跨越目录），
+    匹配某个目录时作用于其下所有文件，如 "global/YoStarJP"、"global/*/resource/template"；
+    include为空时包含全部，exclude优先于include
+    """
+    
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        self.include = [self.split(pattern) for pattern in include or [] if pattern.strip("/")]
+        self.exclude = [self.split(pattern) for pattern in exclude or [] if pattern.strip("/")]
+    
+    @staticmethod
+    def split(path: str) -> List[str]:
+        path = path.strip().strip("/")
+        return path.split("/") if path else []
+    
+    @staticmethod
+    def matches(pattern: List[str], parts: List[str]) -> bool:
+        """规则是否匹配该路径或其某个上级目录"""
+        return (len(parts) >= len(pattern)
+                and all(fnmatchcase(part, rule) for part, rule in zip(parts, pattern)))
+    
+    @staticmethod
+    def may_match_below(pattern: List[str], parts: List[str]) -> bool:
+        """规则是否可能匹配该目录下更深的路径"""
+        return (len(parts) < len(pattern)
+                and all(fnmatchcase(part, rule) for part, rule in zip(parts, pattern)))
+    
+    @property
+    def active(self) -> bool:
+        return bool(self.include or self.exclude)
+    
+    @property
+    def signature(self) -> str:
+        """规则的规范化表示，用于发现规则变化；无规则时为空"""
+        if not self.active:
+            return ""
+        return json.dumps({"include": ["/".join(p) for p in self.include],
+                           "exclude": ["/".join(p) for p in self.exclude]}, sort_keys=True)
+    
+    def allows(self, path: str) -> bool:
+        """文件是否被选中"""
+        parts = self.split(path)
+        if any(self.matches(pattern, parts) for pattern in self.exclude):
+            return False
+        return not self.include or any(self.matches(pattern, parts) for pattern in self.include)
+    
+    def may_contain(self, directory: str) -> bool:
+        """目录下是否可能有被选中的文件，为False时整个子树无需展开"""
+        parts = self.split(directory)
+        if any(self.matches(pattern, parts) for pattern in self.exclude):
+            return False
+        return not self.include or any(
+            self.matches(pattern, parts) or self.may_match_below(pattern, parts)
+            for pattern in self.include
+        )
+    
+    def covers(self, directory: str) -> bool:
+        """目录下的文件是否全部被选中，为True时可一次递归取回整个子树"""
+        parts = self.split(directory)
+        if any(self.matches(pattern, parts) or self.may_match_below(pattern, parts)
+               for pattern in self.exclude):
+            return False
+        return not self.include or any(self.matches(pattern, parts) for pattern in self.include)
+
+def clone_tree(source: Path, destination: Path):
+    """以硬链接复制目录树（只增加目录项，不复制数据），跳过顶层的同步状态文件"""
+    def clone(source_dir: str, destination_dir: Path, top: bool):
+        destination_dir.mkdir(parents=True, exist_ok=True)
+        for entry in os.scandir(source_dir):
+            if top and entry.name.startswith(".sync_"):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                clone(entry.path, destination_dir / entry.name, False)
+            elif entry.is_file(follow_symlinks=False):
+                link_or_copy(Path(entry.path), destination_dir / entry.name)
+    
+    clone(str(source), destination, True)
+
+def remove_trees(paths: List[Path]):
+    """删除目录树，忽略错误（在工作线程中运行）"""
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+class SyncTarget:
+    """一个同步目标（一份MAA安装的resource目录）及其同步索引
+    
+    分代模式下，目标目录只是指向当前一代的符号链接（Windows上为当前一代本身），
+    新一代在暂存目录中构建完成后整体切换，同步状态与对象库保存在同级的
+    ".<目录名>.generations" 中，并保留上一代用于回滚
+    """
+    
+    def __init__(self, local_path: Path, target_folder: str, generations: bool = False):
+        self.live_path = local_path
+        self.local_path = local_path
+        self.target_folder = target_folder
+        self.generations = generations
+        
+        # 同步状态（对象库、HTTP缓存、各代目录）所在位置
+        if generations:
+            self.state_path = local_path.parent / f".{local_path.name}.generations"
+            self.state_path.mkdir(parents=True, exist_ok=True)
+        else:
+            self.state_path = local_path
+        
+        # Windows创建符号链接需要额外权限，改用两次重命名切换
+        self.use_symlink = os.name != "nt"
+        
+        self.cache: Optional[SyncIndex] = None
+        
+        # 本次同步中该目标失败的文件数，有失败时不记录同步提交
+        self.failed = 0
+        
+        # 创建本地目录
+        self.local_path.mkdir(parents=True, exist_ok=True)
+    
+    @property
+    def cache_file(self) -> Path:
+        """文件状态索引（SQLite），分代模式下随每一代保存"""
+        return self.local_path / ".sync_cache.db"
+    
+    @property
+    def legacy_cache_file(self) -> Path:
+        """需要迁移的旧版JSON缓存"""
+        return self.local_path / ".sync_cache.json"
+    
+    @property
+    def staging_path(self) -> Path:
+        return self.state_path / "staging"
+    
+    def get_local_path(self, remote_path: str) -> Path:
+        """将远程路径转换为本地文件路径"""
+        relative_path = remote_path.replace(f"{self.target_folder}/", "", 1)
+        return self.local_path / relative_path
+    
+    def resolve_live(self):
+        """分代模式下定位当前一代的实际目录"""
+        if self.generations:
+            self.local_path = self.live_path.resolve() if self.live_path.is_symlink() else self.live_path
+    
+    def open_index(self) -> SyncIndex:
+        """打开同步索引，首次使用时导入旧版JSON缓存"""
+        cache = SyncIndex(self.cache_file)
+        
+        if self.legacy_cache_file.exists():
+            try:
+                with open(self.legacy_cache_file, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                
+                entries = {path: entry for path, entry in legacy.items() if isinstance(entry, dict)}
+                cache.put_many(entries)
+                if legacy.get("last_commit"):
+                    cache.set_meta("last_commit", legacy["last_commit"])
+                
+                self.legacy_cache_file.unlink()
+                logger.info(f"已将旧版缓存导入同步索引: {len(entries)} 个文件")
+            except Exception as e:
+                logger.warning(f"导入旧版缓存失败: {e}")
+        
+        self.cache = cache
+        return cache
+    
+    def close_index(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+    
+    def list_generations(self) -> List[Path]:
+        """按序号排列的各代目录"""
+        return sorted(path for path in self.state_path.glob("gen-*") if path.is_dir())
+    
+    def next_generation_path(self) -> Path:
+        generations = self.list_generations()
+        sequence = int(generations[-1].name[4:]) + 1 if generations else 1
+        return self.state_path / f"gen-{sequence:06d}"
+    
+    def point_live_to(self, generation: Path):
+        """原子地将目标目录的符号链接指向指定一代"""
+        temp_link = self.live_path.with_name(f".{self.live_path.name}.link")
+        if os.path.lexists(temp_link):
+            os.unlink(temp_link)
+        os.symlink(os.path.relpath(generation, self.live_path.parent), temp_link, target_is_directory=True)
+        os.replace(temp_link, self.live_path)
+    
+    def swap_generation(self) -> List[Path]:
+        """将暂存目录切换为现用的一代，返回除现用与上一代（用于回滚）外需要删除的旧一代"""
+        self.close_index()
+        staging = self.local_path
+        
+        if self.use_symlink:
+            if self.live_path.is_symlink():
+                previous = self.live_path.resolve()
+            elif self.live_path.exists():
+                # 首次启用分代模式时，把现有目录作为上一代移入状态目录
+                previous = self.next_generation_path()
+                os.rename(self.live_path, previous)
+            else:
+                previous = None
+            current = self.next_generation_path()
+            os.rename(staging, current)
+            self.point_live_to(current)
+        else:
+            # 先移走现用目录，移入失败时还原，保证目标目录始终完整
+            previous = self.next_generation_path()
+            os.rename(self.live_path, previous)
+            try:
+                os.rename(staging, self.live_path)
+            except OSError:
+                os.rename(previous, self.live_path)
+                raise
+            current = self.live_path
+        self.local_path = current
+        
+        logger.info(f"已切换到新一代: {current}")
+        
+        # 只保留现用与上一代；删除目录树较慢，由调用方在工作线程中进行
+        keep = {path.resolve() for path in (current, previous) if path is not None}
+        return [path for path in self.list_generations() if path.resolve() not in keep]
+    
+    def rollback(self):
+        """切换回上一代"""
+        self.resolve_live()
+        current = self.local_path.resolve()
+        generations = [path for path in self.list_generations() if path.resolve() != current]
+        if not generations:
+            raise Exception(f"没有可回滚的上一代: {self.live_path}")
+        previous = generations[-1]
+        
+        if self.use_symlink and self.live_path.is_symlink():
+            self.point_live_to(previous)
+            self.local_path = previous
+        else:
+            moved = self.next_generation_path()
+            os.rename(self.live_path, moved)
+            try:
+                os.rename(previous, self.live_path)
+            except OSError:
+                os.rename(moved, self.live_path)
+                raise
+        logger.info(f"已回滚 {self.live_path} 到上一代")
+
+@dataclass
+class SyncConfig:
+    """以库的方式调用时的同步配置"""
+    token: str
+    local_path: str = "./resource"
+    repo_owner: str = "MaaAssistantArknights"
+    repo_name: str = "MaaAssistantArknights"
+    ref: str = "dev"
+    folder: str = "resource"
+    targets: List[str] = field(default_factory=list)
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    generations: bool = False
+    api_base: str = DEFAULT_API_BASE
+    raw_base: str = DEFAULT_RAW_BASE
+    metrics_dir: Optional[str] = None
+    # 每个主机的最大并发请求数与同时下载的总字节数
+    max_concurrency: int = MAX_CONCURRENCY
+    bytes_in_flight: int = DOWNLOAD_BYTES_IN_FLIGHT
+    
+    def __post_init__(self):
+        # 本地路径与索引都以 "<folder>/" 为前缀换算，不支持同步整个仓库
+        if not self.folder.strip("/"):
+            raise ValueError("folder不能为空：暂不支持同步整个仓库，请指定仓库中的文件夹")
+
+@dataclass
+class SyncResult:
+    """一次同步的结果"""
+    commit: Optional[str]
+    up_to_date: bool
+    synced_targets: List[str]
+    failed_targets: List[str]
+    downloaded: int
+    reused: int
+    skipped: int
+    deleted: int
+    failed: int
+    total_files: int
+    duration: float
+    
+    @property
+    def success(self) -> bool:
+        return self.failed == 0
+
+@dataclass
+class SyncEvent:
+    """同步进度事件的基类"""
+
+@dataclass
+class VersionChecked(SyncEvent):
+    """版本检查完成，outdated_targets为需要同步的目标"""
+    outdated_targets: List[str]
+
+@dataclass
+class ScanProgress(SyncEvent):
+    """远程扫描进度：已找到的文件数与已请求的目录树数"""
+    files: int
+    trees: int
+    done: bool = False
+
+@dataclass
+class DownloadPlanned(SyncEvent):
+    """本次需要放置的文件数、不同内容数与需要联网获取的字节数（compare API不提供大小时不计）"""
+    files: int
+    blobs: int
+    bytes: int
+
+@dataclass
+class BytesDownloaded(SyncEvent):
+    """单个文件的下载进度"""
+    path: str
+    received: int
+    size: Optional[int]
+
+@dataclass
+class FileCompleted(SyncEvent):
+    """文件已放置到目标，source为 download、store（对象库）或 local（本地相同内容）"""
+    path: str
+    target: str
+    sha: str
+    source: str
+
+@dataclass
+class FileFailed(SyncEvent):
+    path: str
+    target: str
+    error: str
+
+@dataclass
+class FileDeleted(SyncEvent):
+    path: str
+    target: str
+
+@dataclass
+class SyncFinished(SyncEvent):
+    """事件流的最后一个事件"""
+    result: SyncResult
+
+class GitHubFolderSync:
+    def __init__(self, token: str, local_path: str = "./resource",
+                 api_base: str = DEFAULT_API_BASE, raw_base: str = DEFAULT_RAW_BASE,
+                 metrics_dir: Optional[str] = None, targets: Optional[List[str]] = None,
+                 include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 generations: bool = False, repo_owner: str = "MaaAssistantArknights",
+                 repo_name: str = "MaaAssistantArknights", branch: str = "dev",
+                 target_folder: str = "resource", max_concurrency: int = MAX_CONCURRENCY,
+                 bytes_in_flight: int = DOWNLOAD_BYTES_IN_FLIGHT,
+                 on_event: Optional[Callable[[SyncEvent], None]] = None):
+        """
+        初始化GitHub文件夹同步器
+        
+        Args:
+            token: GitHub个人访问令牌
+            local_path: 本地存储路径
+            api_base: GitHub API地址
+            raw_base: 原始文件下载地址
+            metrics_dir: 指标报告输出目录，默认为本地存储路径（分代模式下为其状态目录）
+            targets: 额外的同步目标（其他MAA安装的resource目录），与本地存储路径共用远程扫描、下载与对象库
+            include: 只同步匹配的路径（相对目标文件夹的glob规则）
+            exclude: 不同步也不删除匹配的路径
+            generations: 分代模式，在暂存目录中构建新一代后整体切换，读取方始终看到完整的目录
+            repo_owner, repo_name, branch, target_folder: 要同步的仓库、分支（或其他引用）与其中的文件夹
+            max_concurrency: 每个主机的最大并发请求数
+            bytes_in_flight: 同时下载的总字节数上限
+            on_event: 进度事件回调，设置后逐个文件的日志降为DEBUG级别
+        """
+        self.token = token
+        self.local_path = Path(local_path)
+        self.api_base = api_base.rstrip("/")
+        self.raw_base = raw_base.rstrip("/")
+        self.repo_owner = repo_owner
+        self.repo_name = repo_name
+        self.branch = branch
+        self.target_folder = target_folder.strip("/")
+        self.bytes_in_flight = bytes_in_flight
+        self.on_event = on_event
+        
+        # 本次同步中版本不同、需要同步的目标
+        self.outdated_targets: List[SyncTarget] = []
+        
+        # 本次同步所对应的远程提交
+        self.remote_commit: Optional[str] = None
+        
+        # 路径过滤规则，未选中的路径既不下载也不删除
+        self.path_filter = PathFilter(include, exclude)
+        
+        # 同步目标，第一个为本地存储路径，各自维护同步索引
+        self.targets = [SyncTarget(self.local_path, self.target_folder, generations)]
+        for target_path in targets or []:
+            self.targets.append(SyncTarget(Path(target_path), self.target_folder, generations))
+        state_path = self.targets[0].state_path
+        
+        # HTTP条件请求校验缓存文件
+        self.http_cache_file = state_path / ".sync_http_cache.json"
+        self.http_cache: Dict[str, Dict] = {}
+        # 按SHA寻址的提交与目录树只在本次同步内缓存：分支前进后不会再被请求，不写入文件
+        self.immutable_cache: Dict[str, str] = {}
+        
+        # 内容寻址对象库，相同内容只下载一次
+        self.store = BlobStore(state_path / OBJECT_STORE_DIR)
+        
+        # API请求头
+        self.headers = {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.v3+json",
+            "User-Agent": "GitHub-Folder-Sync"
+        }
+        
+        # 分阶段耗时与请求指标，每次同步结束后写入报告
+        self.metrics = SyncMetrics()
+        self.metrics_dir = Path(metrics_dir) if metrics_dir else state_path
+        
+        # 常驻模式下跨多次同步复用的会话（连接池）
+        self.session: Optional[aiohttp.ClientSession] = None
+        
+        # 集中的请求调度器，负责并发、限流与重试
+        self.scheduler = RequestScheduler(max_concurrency)
+        
+        # GraphQL批量获取的批大小（随查询成本调整），接口不可用时本次同步不再尝试
+        self.graphql_batch_size = GRAPHQL_INITIAL_BATCH
+        self.graphql_enabled = True
+        
+        # 本地文件哈希线程池
+        self.hash_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        
+        # 统计信息
+        self.stats = {
+            "downloaded": 0,
+            "reused": 0,
+            "skipped": 0,
+            "deleted": 0,
+            "failed": 0,
+            "total_files": 0
+        }
+    
+    @classmethod
+    def from_config(cls, config: SyncConfig,
+                    on_event: Optional[Callable[[SyncEvent], None]] = None) -> "GitHubFolderSync":
+        return cls(
+            config.token, config.local_path, api_base=config.api_base, raw_base=config.raw_base,
+            metrics_dir=config.metrics_dir, targets=config.targets, include=config.include,
+            exclude=config.exclude, generations=config.generations, repo_owner=config.repo_owner,
+            repo_name=config.repo_name, branch=config.ref, target_folder=config.folder,
+            max_concurrency=config.max_concurrency, bytes_in_flight=config.bytes_in_flight,
+            on_event=on_event
+        )
+    
+    def emit(self, event: SyncEvent):
+        """向调用方报告进度事件，回调出错不影响同步"""
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event)
+        except Exception as e:
+            logger.warning(f"进度回调出错: {e!r}")
+    
+    @property
+    def file_log_level(self) -> int:
+        """逐个文件的日志级别：有事件回调时由回调报告进度"""
+        return logging.DEBUG if self.on_event else logging.INFO
+    
+    def build_result(self, duration: float) -> SyncResult:
+        return SyncResult(
+            commit=self.remote_commit,
+            up_to_date=not self.outdated_targets,
+            synced_targets=[str(target.live_path) for target in self.outdated_targets],
+            failed_targets=[str(target.live_path) for target in self.outdated_targets if target.failed],
+            duration=duration,
+            **self.stats
+        )
+    
+    def set_token(self, token: str):
+        """更换token（首次请求返回401并重新输入后）"""
+        self.token = token
+        self.headers["Authorization"] = f"token {token}"
+    
+    def get_file_hash(self, file_path: Path) -> Optional[str]:
+        """获取本地文件的SHA1哈希值"""
+        if not file_path.exists():
+            return None
+        
+        try:
+            return git_blob_sha(file_path)
+        except Exception as e:
+            raise Exception(f"计算 {file_path} 哈希失败：{str(e)}")
+    
+    async def get_file_content(self, session: aiohttp.ClientSession, path: str) -> Optional[str]:
+        """获取文件内容"""
+        url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/contents/{path}"
+        params = {"ref": self.branch}
+        
+        try:
+            body = await self.get_conditional(session, url, params)
+            if body is None:
+                logger.debug(f"文件不存在: {path}")
+            else:
+                data = json.loads(body)
+                if data.get("type") == "file":
+                    content = base64.b64decode(data["content"]).decode('utf-8')
+                    return content
+        except GitHubRequestError as e:
+            # token无效时交给调用方重新获取token
+            if e.status == 401:
+                raise
+            logger.error(f"获取文件内容出错 {path}: {e}")
+        except Exception as e:
+            logger.error(f"获取文件内容出错 {path}: {e}")
+        
+        return None
+    
+    async def get_outdated_targets(self, session: aiohttp.ClientSession) -> List["SyncTarget"]:
+        """返回需要同步的目标：上次同步未完成，或本地version.json与远程不同
+        
+        远程没有version.json（或无法获取）时改为比较上次同步的提交与分支最新提交
+        """
+        # 上次同步中断时version.json可能已是新版本，不能据此跳过
+        outdated = [target for target in self.targets if target.cache.get_meta("pending_commit")]
+        if outdated:
+            logger.info("上次同步未完成，继续同步...")
+        
+        # 过滤规则变化后，新选中的路径需要完整扫描才能补齐
+        for target in self.targets:
+            if target not in outdated and self.filter_changed(target):
+                logger.info(f"路径过滤规则已变化，需要重新扫描: {target.local_path}")
+                outdated.append(target)
+        remaining = [target for target in self.targets if target not in outdated]
+        if not remaining:
+            return outdated
+        
+        version_path = f"{self.target_folder}/version.json"
+        remote_content = await self.get_file_content(session, version_path)
+        
+        if not remote_content:
+            logger.info("无法获取远程version.json，按提交判断是否需要更新")
+            self.remote_commit = await self.get_branch_commit(session)
+            for target in remaining:
+                if target.cache.get_meta("last_commit") != self.remote_commit:
+                    logger.info(f"远程提交已变化，需要更新: {target.local_path}")
+                    outdated.append(target)
+                else:
+                    logger.info(f"提交相同，无需更新: {target.local_path}")
+            return outdated
+        
+        for target in remaining:
+            # 检查本地版本文件
+            local_version_file = target.local_path / "version.json"
+            if not local_version_file.exists():
+                logger.info(f"本地version.json不存在，需要更新: {target.local_path}")
+                outdated.append(target)
+                continue
+            
+            try:
+                async with aiofiles.open(local_version_file, 'r', encoding='utf-8') as f:
+                    local_content = await f.read()
+                
+                # 比较JSON内容
+                if json.loads(remote_content) != json.loads(local_content):
+                    logger.info(f"版本不同，需要更新: {target.local_path}")
+                    outdated.append(target)
+                else:
+                    logger.info(f"版本相同，无需更新: {target.local_path}")
+                    
+            except Exception as e:
+                logger.error(f"比较版本时出错: {e}")
+                outdated.append(target)
+        
+        return outdated
+    
+    def check_up_to_date_quick(self) -> bool:
+        """不加载aiohttp，用一次条件请求判断是否所有目标都已是最新
+        
+        只处理最常见的情况：上次同步已完成、过滤规则未变且远程version.json与本地相同；
+        无法确定时返回False，交给完整的同步流程。token无效（401）时抛出异常
+        """
+        with self.metrics.phase("version_check"):
+            self.open_indexes()
+            try:
+                local_versions = []
+                for target in self.targets:
+                    version_file = target.local_path / "version.json"
+                    if (target.cache.get_meta("pending_commit") or self.filter_changed(target)
+                            or not version_file.exists()):
+                        return False
+                    local_versions.append(version_file.read_text(encoding="utf-8"))
+            finally:
+                self.close_indexes()
+            
+            try:
+                self.http_cache = json.loads(self.http_cache_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.http_cache = {}
+            
+            # 与get_file_content请求同一资源并共用缓存条目，两条路径的ETag保持一致
+            url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/contents/{self.target_folder}/version.json"
+            params = {"ref": self.branch}
+            cache_key = f"{self.headers['Accept']} {url}?ref={self.branch}"
+            cached = self.http_cache.get(cache_key)
+            headers = dict(self.headers)
+            if cached:
+                cached["used"] = datetime.now().date().isoformat()
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+            
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(f"{url}?{urlencode(params)}", headers=headers),
+                             timeout=QUICK_CHECK_TIMEOUT) as response:
+                    status, response_headers = response.status, response.headers
+                    body = response.read().decode("utf-8")
+            except HTTPError as e:
+                # urllib将304也作为HTTPError抛出
+                status, response_headers, body = e.code, e.headers, None
+            except (OSError, HTTPException) as e:
+                # 连接错误以及响应不完整、状态行异常等都交给完整的同步流程
+                logger.debug(f"快速版本检查失败: {e!r}")
+                return False
+            self.metrics.record_request(urlsplit(url).hostname, status,
+                                        time.perf_counter() - start, response_headers)
+            
+            if status == 401:
+                raise GitHubRequestError("Token无效或已过期", 401)
+            if status == 304 and cached:
+                body = cached["body"]
+            elif status == 200:
+                self.http_cache[cache_key] = {
+                    "etag": response_headers.get("ETag"),
+                    "last_modified": response_headers.get("Last-Modified"),
+                    "body": body,
+                    "used": datetime.now().date().isoformat()
+                }
+            else:
+                return False
+            
+            try:
+                remote_version = json.loads(base64.b64decode(json.loads(body)["content"]).decode("utf-8"))
+                if any(json.loads(local_version) != remote_version for local_version in local_versions):
+                    return False
+            except (ValueError, KeyError, TypeError):
+                return False
+        
+        self.write_http_cache()
+        self.metrics.write_reports(self.metrics_dir, self.stats, self.scheduler, True)
+        logger.info("版本相同，无需更新")
+        return True
+    
+    def filter_changed(self, target: "SyncTarget") -> bool:
+        return (target.cache.get_meta("path_filter") or "") != self.path_filter.signature
+    
+    def is_selected(self, remote_path: str) -> bool:
+        """远程路径是否在过滤规则选中的范围内（version.json始终同步，用于版本比较）"""
+        relative_path = remote_path[len(self.target_folder) + 1:]
+        return relative_path == "version.json" or self.path_filter.allows(relative_path)
+    
+    async def load_http_cache(self) -> Dict:
+        """加载HTTP校验缓存（ETag/Last-Modified及对应内容）"""
+        if not self.http_cache_file.exists():
+            return {}
+        
+        try:
+            async with aiofiles.open(self.http_cache_file, 'r', encoding='utf-8') as f:
+                return json.loads(await f.read())
+        except Exception as e:
+            logger.warning(f"加载HTTP缓存失败: {e}")
+            return {}
+    
+    def write_http_cache(self):
+        """保存HTTP校验缓存，丢弃长期未使用的条目"""
+        expire = (datetime.now() - timedelta(days=HTTP_CACHE_EXPIRE_DAYS)).date().isoformat()
+        # 旧版本曾将按SHA寻址的提交与目录树写入文件，一并清除
+        entries = {
+            key: entry for key, entry in self.http_cache.items()
+            if entry.get("used", "") >= expire and "/git/" not in key
+        }
+        temp_path = self.http_cache_file.with_name(f"{self.http_cache_file.name}.tmp")
+        
+        try:
+            temp_path.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+            os.replace(temp_path, self.http_cache_file)
+        except Exception as e:
+            logger.error(f"保存HTTP缓存失败: {e}")
+    
+    async def save_http_cache(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.write_http_cache)
+    
+    async def get_conditional(self, session: aiohttp.ClientSession, url: str,
+                              params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                              immutable: bool = False) -> Optional[str]:
+        """带条件请求的GET，资源未变化（304）时返回缓存内容，404时返回None
+        
+        immutable 表示资源由SHA寻址、内容永不改变，同一次同步中再次请求时直接使用内存中的内容
+        """
+        headers = {**self.headers, **(headers or {})}
+        query = "&".join(f"{key}={value}" for key, value in sorted((params or {}).items()))
+        cache_key = f"{headers['Accept']} {url}?{query}"
+        if immutable and cache_key in self.immutable_cache:
+            return self.immutable_cache[cache_key]
+        cached = None if immutable else self.http_cache.get(cache_key)
+        
+        if cached:
+            cached["used"] = datetime.now().date().isoformat()
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        
+        async with self.scheduler.request(session, "GET", url, headers=headers, params=params) as response:
+            if response.status == 304 and cached:
+                logger.debug(f"资源未变化: {url}")
+                return cached["body"]
+            if response.status == 404:
+                return None
+            if response.status != 200:
+                raise GitHubRequestError(f"请求失败 {url}: {response.status}", response.status)
+            
+            body = await response.text()
+            if immutable:
+                self.immutable_cache[cache_key] = body
+                return body
+            
+            # 只有version.json与分支头等会变化的资源保存校验信息，文件因此保持很小
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.http_cache[cache_key] = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "body": body,
+                    "used": datetime.now().date().isoformat()
+                }
+            return body
+    
+    async def get_json(self, session: aiohttp.ClientSession, url: str,
+                       params: Optional[Dict] = None, immutable: bool = False) -> Dict:
+        """请求GitHub API并返回JSON，失败时抛出异常"""
+        body = await self.get_conditional(session, url, params, immutable=immutable)
+        if body is None:
+            raise GitHubRequestError(f"请求失败 {url}: 404", 404)
+        return json.loads(body)
+    
+    async def get_branch_commit(self, session: aiohttp.ClientSession) -> str:
+        """将分支解析为提交SHA"""
+        url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/commits/{self.branch}"
+        body = await self.get_conditional(session, url, headers={"Accept": "application/vnd.github.sha"})
+        if body is None:
+            raise GitHubRequestError(f"分支不存在: {self.branch}", 404)
+        return body.strip()
+    
+    async def get_tree(self, session: aiohttp.ClientSession, tree_sha: str,
+                       recursive: bool = False) -> Dict:
+        """获取目录树（可递归）"""
+        url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/git/trees/{tree_sha}"
+        params = {"recursive": "1"} if recursive else None
+        return await self.get_json(session, url, params, immutable=True)
+    
+    async def resolve_folder_tree(self, session: aiohttp.ClientSession, commit_sha: str,
+                                  folder: str) -> str:
+        """逐级定位目标文件夹在指定提交中的树SHA"""
+        url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/git/commits/{commit_sha}"
+        commit = await self.get_json(session, url, immutable=True)
+        tree_sha = commit["tree"]["sha"]
+        
+        for name in folder.strip("/").split("/"):
+            tree = await self.get_tree(session, tree_sha)
+            for entry in tree["tree"]:
+                if entry["path"] == name and entry["type"] == "tree":
+                    tree_sha = entry["sha"]
+                    break
+            else:
+                raise Exception(f"远程目录不存在: {folder}")
+        
+        return tree_sha
+    
+    def make_file_info(self, path: str, sha: str, size: Optional[int], mode: str = "100644") -> Dict:
+        """构造与Contents API一致的文件信息"""
+        return {
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": sha,
+            "size": size,
+            "mode": mode,
+            "type": "file",
+            "download_url": f"{self.raw_base}/{self.repo_owner}/{self.repo_name}/"
+                            f"{self.remote_commit}/{quote(path)}"
+        }
+    
+    async def get_remote_changes(self, session: aiohttp.ClientSession,
+                                 base_commit: str) -> Optional[Tuple[Dict[str, Dict], Set[str]]]:
+        """通过compare API获取上次同步以来目标文件夹的变更，无法增量时返回None"""
+        url = (f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/compare/"
+               f"{base_commit}...{self.remote_commit}")
+        
+        try:
+            async with self.scheduler.request(session, "GET", url, headers=self.headers) as response:
+                if response.status == 404:
+                    logger.info(f"上次同步的提交 {base_commit[:12]} 已不存在，执行完整扫描")
+                    return None
+                if response.status != 200:
+                    logger.warning(f"获取提交差异失败: {response.status}，执行完整扫描")
+                    return None
+                data = await response.json()
+        except GitHubRequestError as e:
+            logger.warning(f"获取提交差异失败: {e}，执行完整扫描")
+            return None
+        
+        # 分叉（如强制推送）时三点比较无法还原被丢弃的提交
+        if data.get("status") not in ("ahead", "identical"):
+            logger.info(f"提交历史已分叉 ({data.get('status')})，执行完整扫描")
+            return None
+        
+        files = data.get("files", [])
+        if len(files) >= COMPARE_FILE_LIMIT:
+            logger.info(f"变更文件过多 ({len(files)})，执行完整扫描")
+            return None
+        
+        prefix = f"{self.target_folder}/"
+        changed_files = {}
+        removed_paths = set()
+        
+        for item in files:
+            path = item["filename"]
+            previous_path = item.get("previous_filename")
+            
+            # 重命名视为删除旧路径并下载新路径
+            if (item["status"] == "renamed" and previous_path and previous_path.startswith(prefix)
+                    and self.is_selected(previous_path)):
+                removed_paths.add(previous_path)
+            
+            if not path.startswith(prefix) or not self.is_selected(path):
+                continue
+            
+            if item["status"] == "removed":
+                removed_paths.add(path)
+            else:
+                changed_files[path] = self.make_file_info(path, item["sha"], None)
+        
+        return changed_files, removed_paths
+    
+    def get_stat_fingerprint(self, file_path: Path) -> List[int]:
+        """获取文件的stat指纹（大小、修改时间、inode、设备号）"""
+        st = os.stat(file_path)
+        return [st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev]
+    
+    async def should_download_file(self, file_info: Dict, local_file_path: Path, cache: "SyncIndex") -> bool:
+        """判断是否需要下载文件"""
+        file_path = file_info["path"]
+        remote_sha = file_info.get("sha")
+        remote_size = file_info.get("size")
+        
+        # 如果文件不存在，必须下载
+        try:
+            fingerprint = self.get_stat_fingerprint(local_file_path)
+        except FileNotFoundError:
+            logger.debug(f"文件不存在，需要下载: {file_path}")
+            return True
+        
+        # 检查缓存中的SHA值
+        # git 的 sha 值计算逻辑不太一样
+        cached_info = cache.get(file_path) or {}
+        cached_sha = cached_info.get("sha")
+        cached_fingerprint = cached_info.get("stat")
+        
+        # 指纹未变化说明本地文件仍是缓存记录的版本，无需读取文件
+        if cached_fingerprint == fingerprint:
+            if remote_sha and cached_sha == remote_sha:
+                logger.debug(f"SHA值未变化，跳过: {file_path}")
+                return False
+            logger.debug(f"远程文件已更新，需要下载: {file_path}")
+            return True
+        
+        # 旧版本缓存没有记录指纹，沿用SHA比较结果并补上指纹
+        if cached_fingerprint is None and remote_sha and cached_sha == remote_sha:
+            cache.put(file_path, {**cached_info, "stat": fingerprint})
+            logger.debug(f"SHA值未变化，跳过: {file_path}")
+            return False
+        
+        # 指纹变化说明文件可能被就地修改，与其共享inode的对象已不可信
+        if cached_sha:
+            self.store.discard(cached_sha, fingerprint)
+        
+        # 如果有远程SHA，计算本地文件SHA进行比较
+        if remote_sha:
+            # 大小不同时内容必然不同，不必计算哈希
+            if remote_size is not None and fingerprint[0] != remote_size:
+                logger.debug(f"文件大小不同，需要下载: {file_path}")
+                return True
+            
+            # 在线程池中分块计算哈希，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            local_sha = await loop.run_in_executor(self.hash_executor, self.get_file_hash, local_file_path)
+            if local_sha == remote_sha:
+                # 更新缓存中的SHA值
+                cache.put(file_path, {
+                    "sha": remote_sha,
+                    "size": fingerprint[0],
+                    "last_modified": datetime.now().isoformat(),
+                    "stat": fingerprint
+                })
+                logger.debug(f"文件SHA值相同，跳过: {file_path}")
+                return False
+        
+        # 其他情况都需要下载
+        logger.debug(f"需要下载: {file_path}")
+        return True
+    
+    async def download_file(self, session: aiohttp.ClientSession, file_info: Dict):
+        """流式下载单个blob到对象库，校验通过后才写入对象"""
+        # 先写入临时文件，中断或校验失败都不会留下半个对象
+        expected_sha = file_info["sha"]
+        expected_size = file_info.get("size")
+        temp_path = self.store.temp_path(expected_sha)
+        
+        try:
+            # 使用download_url直接下载文件内容
+            download_url = file_info.get("download_url")
+            if not download_url:
+                raise Exception("无法获取下载链接")
+            
+            for attempt in range(MAX_RETRIES + 1):
+                async with self.scheduler.request(session, "GET", download_url) as response:
+                    if response.status != 200:
+                        raise Exception(f"下载失败: {response.status}")
+                    
+                    # 已知文件大小时边接收边计算git blob SHA，无需回读文件
+                    hasher = new_blob_hasher(expected_size) if expected_size is not None else None
+                    
+                    received = 0
+                    try:
+                        async with aiofiles.open(temp_path, 'wb') as f:
+                            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                                if hasher:
+                                    hasher.update(chunk)
+                                await f.write(chunk)
+                                if self.on_event:
+                                    received += len(chunk)
+                                    self.emit(BytesDownloaded(file_info["path"], received, expected_size))
+                        break
+                    except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError,
+                            asyncio.TimeoutError) as e:
+                        # 传输中断时重新下载整个文件
+                        if attempt >= MAX_RETRIES:
+                            raise
+                        self.scheduler.retries += 1
+                        logger.warning(f"下载中断，准备重试 {file_info['path']}: {e!r}")
+                
+                await asyncio.sleep(self.scheduler.backoff_delay(attempt))
+            
+            if hasher:
+                local_sha = hasher.hexdigest()
+            else:
+                # compare API不提供文件大小，只能写完后再计算
+                loop = asyncio.get_running_loop()
+                local_sha = await loop.run_in_executor(self.hash_executor, self.get_file_hash, temp_path)
+            
+            if local_sha != expected_sha:
+                raise Exception(f"校验失败，期望 {expected_sha[:12]}，实际 {local_sha[:12]}")
+            
+            self.store.commit(temp_path, expected_sha)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+    
+    def is_graphql_candidate(self, file_info: Dict) -> bool:
+        """小的文本文件可以通过GraphQL批量获取（compare API不提供大小时按扩展名判断）"""
+        size = file_info.get("size")
+        return (Path(file_info["path"]).suffix.lower() in GRAPHQL_TEXT_EXTENSIONS
+                and (size is None or size <= GRAPHQL_TEXT_LIMIT))
+    
+    async def fetch_graphql_batch(self, session: aiohttp.ClientSession, batch: List[Dict]) -> Set[str]:
+        """用一次GraphQL查询取回一批blob的文本，校验SHA后写入对象库，返回成功的SHA"""
+        # 以提交SHA定位文件，每个文件对应一个别名字段
+        expressions = [json.dumps(f"{self.remote_commit}:{file_info['path']}") for file_info in batch]
+        fields = " ".join(
+            f"f{i}: object(expression: {expression}) "
+            "{ ... on Blob { oid byteSize isBinary isTruncated text } }"
+            for i, expression in enumerate(expressions)
+        )
+        query = (f"query {{ rateLimit {{ cost remaining }} "
+                 f"repository(owner: {json.dumps(self.repo_owner)}, name: {json.dumps(self.repo_name)}) {{ {fields} }} }}")
+        
+        async with self.scheduler.request(session, "POST", f"{self.api_base}/graphql",
+                                          json={"query": query}) as response:
+            if response.status != 200:
+                raise GitHubRequestError(f"GraphQL请求失败: {response.status}", response.status)
+            result = await response.json()
+        
+        data = result.get("data") or {}
+        nodes = data.get("repository")
+        if not nodes:
+            raise GitHubRequestError(f"GraphQL查询出错: {result.get('errors')}")
+        
+        # 按查询成本调整批大小：超出目标成本时按比例缩小，否则逐步扩大
+        rate = data.get("rateLimit") or {}
+        cost = rate.get("cost") or 1
+        if cost > GRAPHQL_TARGET_COST:
+            self.graphql_batch_size = max(GRAPHQL_MIN_FILES, int(len(batch) * GRAPHQL_TARGET_COST / cost))
+        else:
+            self.graphql_batch_size = min(GRAPHQL_MAX_BATCH, self.graphql_batch_size * 2)
+        if rate.get("remaining", GRAPHQL_MIN_REMAINING) < GRAPHQL_MIN_REMAINING:
+            self.graphql_enabled = False
+        
+        fetched = set()
+        for i, file_info in enumerate(batch):
+            # 二进制、被截断或不存在的内容留给逐个下载
+            blob = nodes.get(f"f{i}")
+            if not blob or blob.get("isBinary") or blob.get("isTruncated") or blob.get("text") is None:
+                continue
+            content = blob["text"].encode("utf-8")
+            hasher = new_blob_hasher(len(content))
+            hasher.update(content)
+            if hasher.hexdigest() != file_info["sha"]:
+                logger.debug(f"GraphQL内容校验失败，改为直接下载: {file_info['path']}")
+                continue
+            self.store.add_bytes(file_info["sha"], content)
+            fetched.add(file_info["sha"])
+        return fetched
+    
+    async def prefetch_small_blobs(self, session: aiohttp.ClientSession, pending: Dict[str, Dict]) -> Set[str]:
+        """通过GraphQL批量获取小文本文件，未取得的文件之后再逐个下载"""
+        candidates = deque(file_info for file_info in pending.values() if self.is_graphql_candidate(file_info))
+        if len(candidates) < GRAPHQL_MIN_FILES or not self.graphql_enabled:
+            return set()
+        
+        total = len(candidates)
+        fetched = set()
+        requests = 0
+        # 每个查询的响应整体保存在内存中，各查询按已知大小分摊下载字节数上限；大小未知时按上限估计
+        batch_budget = max(GRAPHQL_TEXT_LIMIT, self.bytes_in_flight // GRAPHQL_CONCURRENCY)
+        
+        def take_batch() -> List[Dict]:
+            batch, batch_bytes = [], 0
+            while candidates and len(batch) < self.graphql_batch_size:
+                size = candidates[0].get("size")
+                size = GRAPHQL_TEXT_LIMIT if size is None else size
+                if batch and batch_bytes + size > batch_budget:
+                    break
+                batch.append(candidates.popleft())
+                batch_bytes += size
+            return batch
+        
+        async def worker():
+            nonlocal requests
+            while candidates and self.graphql_enabled:
+                batch = take_batch()
+                requests += 1
+                try:
+                    fetched.update(await self.fetch_graphql_batch(session, batch))
+                except (GitHubRequestError, aiohttp.ClientError, ValueError) as e:
+                    # 接口不可用（如局域网镜像、令牌无权限）时本次同步不再尝试，其他错误缩小批大小
+                    if isinstance(e, GitHubRequestError) and e.status in (401, 403, 404):
+                        self.graphql_enabled = False
+                    self.graphql_batch_size = max(GRAPHQL_MIN_FILES, self.graphql_batch_size // 2)
+                    logger.warning(f"GraphQL批量获取失败，改为逐个下载: {e}")
+        
+        await asyncio.gather(*(worker() for _ in range(GRAPHQL_CONCURRENCY)))
+        logger.info(f"GraphQL批量获取 {len(fetched)}/{total} 个文件，共 {requests} 个请求")
+        return fetched
+    
+    def estimate_size(self, placements: List[Tuple[Dict, Path, "SyncTarget"]]) -> int:
+        """下载前估计内容大小：compare API不提供大小，按索引中该路径上一版本的大小估计，新增文件记为0"""
+        size = placements[0][0].get("size")
+        if size is not None:
+            return size
+        for file_info, _, target in placements:
+            previous = target.cache.get(file_info["path"])
+            if previous and previous.get("size") is not None:
+                return previous["size"]
+        return 0
+    
+    def find_local_copy(self, sha: str) -> Optional[Path]:
+        """在所有目标中查找内容为指定SHA且未被改动的本地文件"""
+        for target in self.targets:
+            for file_path, entry in target.cache.find_by_sha(sha).items():
+                local_file_path = target.get_local_path(file_path)
+                try:
+                    if entry["stat"] and self.get_stat_fingerprint(local_file_path) == entry["stat"]:
+                        return local_file_path
+                except FileNotFoundError:
+                    continue
+        return None
+    
+    async def sync_blob(self, session: aiohttp.ClientSession, sha: str,
+                        placements: List[Tuple[Dict, Path, "SyncTarget"]], prefetched: bool = False):
+        """获取一个blob并放置到所有引用它的路径（可跨多个目标）
+        
+        优先使用对象库中已有的对象，其次复用本地其他路径上的相同内容，都没有时才下载；
+        prefetched表示对象刚由归档解压或GraphQL批量取得，计入下载数
+        """
+        file_info = placements[0][0]
+        fetched = prefetched
+        source = "download" if prefetched else "store"
+        try:
+            if not prefetched and not self.store.has(sha, file_info.get("size")):
+                local_copy = self.find_local_copy(sha)
+                if local_copy is not None:
+                    self.store.add_file(local_copy, sha)
+                    source = "local"
+                else:
+                    await self.download_file(session, file_info)
+                    fetched = True
+                    source = "download"
+                    logger.log(self.file_log_level, f"下载完成: {file_info['path']}")
+        except Exception as e:
+            for info, _, target in placements:
+                target.failed += 1
+                self.emit(FileFailed(info["path"], str(target.live_path), str(e)))
+            self.stats["failed"] += len(placements)
+            logger.error(f"同步文件出错 {file_info['path']}: {e}")
+            return
+        
+        if fetched:
+            self.stats["downloaded"] += 1
+        
+        placed = 0
+        for info, local_file_path, target in placements:
+            try:
+                self.store.place(sha, local_file_path)
+                fingerprint = self.get_stat_fingerprint(local_file_path)
+                
+                # 更新缓存
+                target.cache.put(info["path"], {
+                    "sha": sha,
+                    "size": fingerprint[0],
+                    "last_modified": datetime.now().isoformat(),
+                    "stat": fingerprint
+                })
+                placed += 1
+                self.emit(FileCompleted(info["path"], str(target.live_path), sha, source))
+            except Exception as e:
+                target.failed += 1
+                self.stats["failed"] += 1
+                self.emit(FileFailed(info["path"], str(target.live_path), str(e)))
+                logger.error(f"放置文件出错 {local_file_path}: {e}")
+        
+        reused = placed - 1 if fetched and placed else placed
+        self.stats["reused"] += reused
+        if reused:
+            logger.debug(f"复用相同内容: {file_info['path']} 等 {reused} 个文件")
+    
+    async def place_blobs(self, session: aiohttp.ClientSession,
+                          blob_placements: Dict[str, List[Tuple[Dict, Path, "SyncTarget"]]], prefetched: Set[str]):
+        """获取各blob并放置到引用它的路径，同步与修复共用
+        
+        小文本文件先通过GraphQL批量取回，其余按大小与在途字节预算下载；
+        提交标记在所属目标的其他文件全部成功后最后写入
+        """
+        # 需要联网获取的小文本文件先通过GraphQL批量取回
+        pending = {
+            sha: placements[0][0] for sha, placements in blob_placements.items()
+            if sha not in prefetched and not self.store.has(sha) and self.find_local_copy(sha) is None
+        }
+        prefetched = prefetched | await self.prefetch_small_blobs(session, pending)
+        
+        pending_count = sum(len(placements) for placements in blob_placements.values())
+        logger.info(f"开始同步 {pending_count} 个文件（{len(blob_placements)} 个不同内容）...")
+        
+        # version.json等提交标记留到最后写入，MAA看到新版本号时其余文件均已就绪
+        marker_placements: Dict[str, List[Tuple[Dict, Path, SyncTarget]]] = {}
+        for sha in list(blob_placements):
+            regular = []
+            for placement in blob_placements[sha]:
+                if placement[0]["path"][len(self.target_folder) + 1:] in COMMIT_MARKER_FILES:
+                    marker_placements.setdefault(sha, []).append(placement)
+                else:
+                    regular.append(placement)
+            if regular:
+                blob_placements[sha] = regular
+            else:
+                del blob_placements[sha]
+        
+        # 按大小与在途字节预算安排下载，已在对象库中的内容不占预算
+        planner = DownloadPlanner([
+            (sha, 0 if sha in prefetched or self.store.has(sha) else self.estimate_size(placements))
+            for sha, placements in blob_placements.items()
+        ], self.bytes_in_flight)
+        self.emit(DownloadPlanned(pending_count, len(blob_placements) + len(marker_placements),
+                                  sum(size for _, size in planner.queue)))
+        await planner.run(lambda sha: self.sync_blob(session, sha, blob_placements[sha], sha in prefetched),
+                          min(DOWNLOAD_WORKERS, self.scheduler.max_concurrency))
+        logger.debug(f"下载期间最多同时进行 {planner.peak_in_flight} 字节")
+        
+        # 有文件失败的目标不写入提交标记，之后继续补齐
+        for sha, placements in marker_placements.items():
+            placements = [placement for placement in placements if placement[2].failed == 0]
+            if placements:
+                await self.sync_blob(session, sha, placements, sha in prefetched)
+    
+    def should_bootstrap(self, pending_count: int, total_count: int) -> bool:
+        """根据待下载文件数量判断是否改用归档引导"""
+        return (pending_count >= BOOTSTRAP_MIN_FILES
+                and pending_count >= total_count * BOOTSTRAP_RATIO)
+    
+    async def bootstrap_from_archive(self, session: aiohttp.ClientSession,
+                                     pending_files: Dict[str, Dict]) -> Set[str]:
+        """流式下载当前提交的tar包，只将目标文件夹中待下载的内容解压到对象库，返回取得的SHA"""
+        url = f"{self.api_base}/repos/{self.repo_owner}/{self.repo_name}/tarball/{self.remote_commit}"
+        loop = asyncio.get_running_loop()
+        extracted = set()
+        
+        logger.info(f"待下载文件较多 ({len(pending_files)})，改为流式解压仓库归档...")
+        try:
+            # 归档较大，只限制单次读取的间隔而不限制总时长
+            timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+            async with self.scheduler.request(session, "GET", url, timeout=timeout) as response:
+                if response.status != 200:
+                    logger.warning(f"下载仓库归档失败: {response.status}，改为逐个下载")
+                    return set()
+                
+                # tarfile只支持同步读取，在工作线程中解压并通过事件循环取数据
+                reader = AsyncStreamReader(response.content, loop)
+                await loop.run_in_executor(None, self.extract_archive, reader, pending_files, extracted)
+        except Exception as e:
+            logger.warning(f"解压仓库归档出错: {e}，剩余文件改为逐个下载")
+        
+        logger.info(f"归档解压完成: {len(extracted)} 个不同内容")
+        return extracted
+    
+    def extract_archive(self, fileobj, pending_files: Dict[str, Dict], extracted: Set[str]):
+        """从tar流中解压待下载文件到对象库，校验SHA后原子写入（在工作线程中运行）"""
+        with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+            for member in tar:
+                # 归档内路径以 "<owner>-<repo>-<短SHA>/" 开头
+                file_path = member.name.partition("/")[2]
+                file_info = pending_files.get(file_path)
+                if file_info is None or not member.isfile():
+                    continue
+                
+                # 相同内容只写入对象库一次
+                sha = file_info["sha"]
+                if sha in extracted or self.store.has(sha, member.size):
+                    continue
+                
+                temp_path = self.store.temp_path(sha)
+                hasher = new_blob_hasher(member.size)
+                source = tar.extractfile(member)
+                with open(temp_path, "wb") as f:
+                    while chunk := source.read(DOWNLOAD_CHUNK_SIZE):
+                        hasher.update(chunk)
+                        f.write(chunk)
+                
+                # 归档可能经过export-subst等属性转换，校验不通过的留给逐个下载
+                if hasher.hexdigest() != sha:
+                    temp_path.unlink()
+                    logger.debug(f"归档文件校验不一致，稍后单独下载: {file_path}")
+                    continue
+                
+                self.store.commit(temp_path, sha)
+                extracted.add(sha)
+    
+    async def collect_all_remote_files(self, session: aiohttp.ClientSession, 
+                                     remote_path: str) -> Dict[str, Dict]:
+        """通过Git Trees API收集所有远程文件信息"""
+        all_files = {}
+        requested_trees = 0
+        
+        # 先将分支解析为提交，保证整个同步过程看到的是同一个快照
+        if not self.remote_commit:
+            self.remote_commit = await self.get_branch_commit(session)
+        
+        root_tree_sha = await self.resolve_folder_tree(session, self.remote_commit, remote_path)
+        root = remote_path.strip("/")
+        
+        # 仅在目录树被截断或过滤规则需要区分子目录时才逐层展开，其余子树仍然一次取回
+        async def collect_tree(tree_sha: str, prefix: str, recursive: bool):
+            nonlocal requested_trees
+            
+            tree = await self.get_tree(session, tree_sha, recursive=recursive)
+            requested_trees += 1
+            self.emit(ScanProgress(len(all_files), requested_trees))
+            
+            if recursive and tree.get("truncated"):
+                logger.info(f"目录树被截断，逐层展开: {prefix}")
+                await collect_tree(tree_sha, prefix, recursive=False)
+                return
+            
+            subtrees = []
+            for entry in tree["tree"]:
+                path = f"{prefix}/{entry['path']}"
+                if entry["type"] == "blob" and entry["mode"] != "120000":
+                    if self.is_selected(path):
+                        all_files[path] = self.make_file_info(path, entry["sha"], entry.get("size"),
+                                                              entry["mode"])
+                elif entry["type"] == "tree" and not recursive:
+                    # 在展开前剪枝：完全未选中的子树不请求
+                    relative_path = path[len(root) + 1:]
+                    if self.path_filter.may_contain(relative_path):
+                        subtrees.append(collect_tree(entry["sha"], path,
+                                                     recursive=self.path_filter.covers(relative_path)))
+            
+            if subtrees:
+                await asyncio.gather(*subtrees)
+        
+        await collect_tree(root_tree_sha, root, recursive=self.path_filter.covers(""))
+        
+        logger.info(f"扫描完成! 共找到 {len(all_files)} 个文件，请求了 {requested_trees} 个目录树")
+        self.emit(ScanProgress(len(all_files), requested_trees, done=True))
+        return all_files
+    
+    async def cleanup_deleted_files(self, remote_files: Dict[str, Dict], target: "SyncTarget"):
+        """清理远程已删除的本地文件"""
+        remote_paths = set(remote_files.keys())
+        cached_paths = target.cache.paths(f"{self.target_folder}/")
+        
+        # 找出本地有但远程没有的文件，未选中的路径保持原样
+        deleted_paths = {path for path in cached_paths - remote_paths if self.is_selected(path)}
+        await self.delete_local_files(deleted_paths, target)
+    
+    async def delete_local_files(self, deleted_paths: Set[str], target: "SyncTarget"):
+        """删除本地文件并从缓存中移除"""
+        for deleted_path in deleted_paths:
+            local_file_path = target.get_local_path(deleted_path)
+            
+            if local_file_path.exists():
+                try:
+                    local_file_path.unlink()
+                    logger.log(self.file_log_level, f"删除本地文件: {deleted_path}")
+                    self.stats["deleted"] += 1
+                    self.emit(FileDeleted(deleted_path, str(target.live_path)))
+                except Exception as e:
+                    logger.error(f"删除文件失败 {deleted_path}: {e}")
+            
+            # 从缓存中移除
+            target.cache.remove(deleted_path)
+    
+    def create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池与指标钩子的会话"""
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=self.scheduler.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=300)
+        
+        return aiohttp.ClientSession(
+            connector=connector, 
+            timeout=timeout,
+            headers=self.headers,
+            trace_configs=[self.metrics.create_trace_config()]
+        )
+    
+    def reset_run_state(self):
+        """重置单次同步的统计与指标，供常驻模式复用同一个同步器"""
+        self.stats = {key: 0 for key in self.stats}
+        self.metrics.reset()
+        self.scheduler.retries = 0
+        self.remote_commit = None
+        self.immutable_cache.clear()
+        self.graphql_enabled = True
+        for target in self.targets:
+            target.failed = 0
+    
+    def open_indexes(self):
+        for target in self.targets:
+            target.resolve_live()
+            target.open_index()
+    
+    def close_indexes(self):
+        for target in self.targets:
+            target.close_index()
+        self.store.close()
+    
+    async def stage_generation(self, target: "SyncTarget"):
+        """分代模式下准备暂存目录，之后的同步只修改暂存目录，现用的一代保持不变"""
+        staging = target.staging_path
+        if staging.exists():
+            logger.info(f"继续使用上次未完成的暂存目录: {staging}")
+        else:
+            # 未变化的文件以硬链接取自当前一代，索引随之复制，stat指纹保持有效
+            temp_path = staging.with_name(f"{staging.name}.tmp")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.hash_executor, remove_trees, [temp_path])
+            await loop.run_in_executor(self.hash_executor, clone_tree, target.local_path, temp_path)
+            target.cache.backup(temp_path / ".sync_cache.db")
+            os.rename(temp_path, staging)
+        
+        target.close_index()
+        target.local_path = staging
+        target.open_index()
+    
+    async def activate_generation(self, target: "SyncTarget") -> bool:
+        """切换到暂存目录中构建完成的一代并在工作线程中删除多余的旧一代，切换失败时返回False"""
+        try:
+            stale = target.swap_generation()
+        except OSError as e:
+            # 目录被占用等情况下保留暂存目录，下次同步再切换
+            logger.error(f"切换新一代失败 {target.live_path}: {e}")
+            return False
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.hash_executor, remove_trees, stale)
+        return True
+    
+    async def is_up_to_date(self, session: aiohttp.ClientSession) -> bool:
+        """快速判断所有目标是否已是最新（通常只需一次304请求）"""
+        if not self.http_cache:
+            self.http_cache = await self.load_http_cache()
+        
+        self.open_indexes()
+        try:
+            return not await self.get_outdated_targets(session)
+        finally:
+            self.close_indexes()
+    
+    async def sync_folder(self):
+        """同步整个文件夹"""
+        # 加载HTTP校验缓存（常驻模式下保留在内存中），打开各目标的同步索引
+        if not self.http_cache:
+            self.http_cache = await self.load_http_cache()
+        self.open_indexes()
+        success = False
+        
+        try:
+            # 常驻模式复用已打开的会话，否则为本次同步创建会话
+            if self.session is not None:
+                await self.sync_with_session(self.session)
+            else:
+                async with self.create_session() as session:
+                    await self.sync_with_session(session)
+            success = self.stats["failed"] == 0
+        finally:
+            with self.metrics.phase("cache_save"):
+                self.close_indexes()
+                await self.save_http_cache()
+            self.metrics.write_reports(self.metrics_dir, self.stats, self.scheduler, success)
+    
+    async def sync_with_session(self, session: aiohttp.ClientSession):
+        """使用给定会话执行一次同步，所有目标共用远程扫描与下载"""
+        logger.info("开始检查版本...")
+        
+        # 检查哪些目标需要更新
+        with self.metrics.phase("version_check"):
+            targets = await self.get_outdated_targets(session)
+            self.outdated_targets = targets
+        self.emit(VersionChecked([str(target.live_path) for target in targets]))
+        
+        if not targets:
+            logger.info("版本已是最新，无需同步")
+            return
+        
+        logger.info(f"版本已更新，开始增量同步 {len(targets)} 个目标...")
+        
+        for target in targets:
+            if target.generations:
+                await self.stage_generation(target)
+        
+        with self.metrics.phase("remote_scan"):
+            self.remote_commit = await self.get_branch_commit(session)
+            logger.info(f"远程分支 {self.branch} 位于提交 {self.remote_commit[:12]}")
+            
+            # 每个目标的远程文件与需删除的路径（None表示按完整列表清理）
+            plans: Dict[SyncTarget, Tuple[Dict[str, Dict], Optional[Set[str]]]] = {}
+            changes_by_base: Dict[str, Optional[Tuple[Dict[str, Dict], Set[str]]]] = {}
+            full_listing: Optional[Dict[str, Dict]] = None
+            
+            for target in targets:
+                target.cache.set_meta("pending_commit", self.remote_commit)
+                
+                # 优先基于上次同步的提交获取增量变更，起点相同的目标只获取一次
+                changes = None
+                last_commit = target.cache.get_meta("last_commit")
+                if last_commit and last_commit != self.remote_commit and not self.filter_changed(target):
+                    if last_commit not in changes_by_base:
+                        logger.info(f"获取自提交 {last_commit[:12]} 以来的变更...")
+                        changes_by_base[last_commit] = await self.get_remote_changes(session, last_commit)
+                    changes = changes_by_base[last_commit]
+                
+                if changes is None:
+                    if full_listing is None:
+                        # 收集所有远程文件信息
+                        logger.info("收集远程文件信息...")
+                        full_listing = await self.collect_all_remote_files(session, self.target_folder)
+                    plans[target] = (full_listing, None)
+                else:
+                    remote_files, removed_paths = changes
+                    logger.info(f"增量变更: {len(remote_files)} 个文件更新，{len(removed_paths)} 个文件删除")
+                    plans[target] = changes
+            
+            self.stats["total_files"] = sum(len(remote_files) for remote_files, _ in plans.values())
+        
+        with self.metrics.phase("cleanup"):
+            for target, (remote_files, removed_paths) in plans.items():
+                if removed_paths is None:
+                    # 清理已删除的文件
+                    await self.cleanup_deleted_files(remote_files, target)
+                else:
+                    await self.delete_local_files(removed_paths, target)
+        
+        with self.metrics.phase("local_diff"):
+            # 计算本地文件路径
+            checks = [
+                (file_info, target.get_local_path(file_path), target)
+                for target, (remote_files, _) in plans.items()
+                for file_path, file_info in remote_files.items()
+            ]
+            
+            # 并发检查所有目标的本地文件，确需哈希的文件在线程池中计算
+            needs_download = await asyncio.gather(*(
+                self.should_download_file(file_info, local_file_path, target.cache)
+                for file_info, local_file_path, target in checks
+            ))
+            
+            # 按blob SHA分组，相同内容（包括不同目标中的同一文件）只获取一次
+            blob_placements: Dict[str, List[Tuple[Dict, Path, SyncTarget]]] = {}
+            for placement, need_download in zip(checks, needs_download):
+                # 检查是否需要下载
+                if need_download:
+                    blob_placements.setdefault(placement[0]["sha"], []).append(placement)
+                else:
+                    self.stats["skipped"] += 1
+        
+        with self.metrics.phase("download"):
+            # 对象库中没有的内容占大多数时（如首次同步），改为流式解压仓库归档
+            missing_files = {
+                file_info["path"]: file_info
+                for sha, placements in blob_placements.items() if not self.store.has(sha)
+                for file_info, _, _ in placements
+            }
+            prefetched = set()
+            if self.should_bootstrap(len(missing_files), len(full_listing or missing_files)):
+                prefetched = await self.bootstrap_from_archive(session, missing_files)
+            
+            if blob_placements:
+                await self.place_blobs(session, blob_placements, prefetched)
+            else:
+                logger.info("所有文件均为最新，无需下载")
+        
+        # 目标的全部文件成功后才记录同步提交，否则下次从旧提交重新获取差异
+        with self.metrics.phase("cache_save"):
+            for target in targets:
+                target.cache.set_meta("last_sync", datetime.now().isoformat())
+                if target.failed == 0:
+                    target.cache.set_meta("last_commit", self.remote_commit)
+                    target.cache.set_meta("path_filter", self.path_filter.signature)
+                    target.cache.delete_meta("pending_commit")
+                    if target.generations:
+                        await self.activate_generation(target)
+                else:
+                    logger.warning(f"目标 {target.local_path} 有 {target.failed} 个文件失败，下次同步重试")
+        
+        with self.metrics.phase("store_gc"):
+            # 同步进度记录之后再清理不再被任何文件引用的对象（包括被移除的旧一代引用的对象），
+            # 清理失败不影响本次同步的结果；遍历整个对象库较慢，在工作线程中进行，不阻塞同一进程中的其他同步
+            if self.stats["downloaded"] or self.stats["reused"] or self.stats["deleted"]:
+                try:
+                    loop = asyncio.get_running_loop()
+                    removed = await loop.run_in_executor(self.hash_executor, self.store.gc)
+                    logger.debug(f"对象库清理: {removed} 个对象")
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"对象库清理失败: {e}")
+        
+        # 输出统计信息
+        logger.info("=" * 50)
+        logger.info("同步完成! 统计信息:")
+        logger.info(f"同步目标: {len(targets)}/{len(self.targets)}")
+        logger.info(f"总文件数: {self.stats['total_files']}")
+        logger.info(f"下载文件: {self.stats['downloaded']}")
+        logger.info(f"复用文件: {self.stats['reused']}")
+        logger.info(f"跳过文件: {self.stats['skipped']}")
+        logger.info(f"删除文件: {self.stats['deleted']}")
+        logger.info(f"失败文件: {self.stats['failed']}")
+        logger.info(f"请求重试: {self.scheduler.retries}")
+        for phase, seconds in self.metrics.phases.items():
+            logger.info(f"阶段耗时 {phase}: {seconds:.2f}s")
+        logger.info("=" * 50)
+    
+    async def verify_folder(self, repair: bool = False) -> List[Dict]:
+        """校验所有目标的本地文件与远程清单是否一致，可选修复不一致的文件"""
+        if not self.http_cache:
+            self.http_cache = await self.load_http_cache()
+        self.open_indexes()
+        
+        try:
+            async with self.create_session() as session:
+                return await self.verify_with_session(session, repair)
+        finally:
+            self.close_indexes()
+            await self.save_http_cache()
+    
+    async def verify_with_session(self, session: aiohttp.ClientSession, repair: bool) -> List[Dict]:
+        """按上次同步的提交获取远程清单，在多个进程中并行计算本地文件哈希"""
+        branch_commit = None
+        manifests: Dict[str, Dict[str, Dict]] = {}
+        reports = []
+        
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            for target in self.targets:
+                # 以目标上次同步（或正在同步）的提交为准，从未同步过时使用分支最新提交
+                commit = target.cache.get_meta("pending_commit") or target.cache.get_meta("last_commit")
+                if not commit:
+                    branch_commit = branch_commit or await self.get_branch_commit(session)
+                    commit = branch_commit
+                if commit not in manifests:
+                    logger.info(f"获取提交 {commit[:12]} 的文件清单...")
+                    self.remote_commit = commit
+                    manifests[commit] = await self.collect_all_remote_files(session, self.target_folder)
+                self.remote_commit = commit
+                
+                report = await self.verify_target(session, target, manifests[commit], pool, repair)
+                report["commit"] = commit
+                reports.append(report)
+        
+        return reports
+    
+    async def verify_target(self, session: aiohttp.ClientSession, target: "SyncTarget",
+                            remote_files: Dict[str, Dict], pool: ProcessPoolExecutor,
+                            repair: bool) -> Dict:
+        """校验单个目标，返回缺失、被修改与多余文件的报告"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        prefix = f"{self.target_folder}/"
+        local_files = await loop.run_in_executor(None, scan_tree, target.local_path)
+        
+        missing = []
+        modified = []
+        candidates = []
+        for file_path, file_info in remote_files.items():
+            relative_path = file_path[len(prefix):]
+            size = local_files.get(relative_path)
+            if size is None:
+                missing.append(file_path)
+            elif file_info.get("size") is not None and size != file_info["size"]:
+                # 大小不同时内容必然不同，不必计算哈希
+                modified.append(file_path)
+            else:
+                candidates.append(file_path)
+        
+        untracked = sorted(
+            prefix + relative_path for relative_path in local_files
+            if prefix + relative_path not in remote_files and self.is_selected(prefix + relative_path)
+        )
+        
+        # 按文件数与字节数分批，交给进程池在所有核心上计算哈希
+        batches = []
+        batch, batch_bytes = [], 0
+        for file_path in candidates:
+            batch.append(file_path)
+            batch_bytes += local_files[file_path[len(prefix):]]
+            if len(batch) >= VERIFY_BATCH_FILES or batch_bytes >= VERIFY_BATCH_BYTES:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            batches.append(batch)
+        
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, hash_file_batch, [str(target.get_local_path(path)) for path in batch])
+            for batch in batches
+        ))
+        
+        verified = {}
+        for batch, hashes in zip(batches, results):
+            for file_path, local_sha in zip(batch, hashes):
+                if local_sha != remote_files[file_path]["sha"]:
+                    modified.append(file_path)
+                    continue
+                # 校验通过的文件刷新索引中的指纹，之后的同步无需再次计算
+                try:
+                    fingerprint = self.get_stat_fingerprint(target.get_local_path(file_path))
+                except FileNotFoundError:
+                    missing.append(file_path)
+                    continue
+                verified[file_path] = {
+                    "sha": local_sha,
+                    "size": fingerprint[0],
+                    "last_modified": datetime.now().isoformat(),
+                    "stat": fingerprint
+                }
+        target.cache.put_many(verified)
+        modified.sort()
+        missing.sort()
+        
+        logger.info(f"校验完成 {target.local_path}: {len(remote_files)} 个文件，"
+                    f"缺失 {len(missing)}，被修改 {len(modified)}，多余 {len(untracked)}，"
+                    f"耗时 {time.perf_counter() - start:.2f}s")
+        for label, paths in (("缺失", missing), ("被修改", modified), ("多余", untracked)):
+            for path in paths[:VERIFY_REPORT_LIMIT]:
+                logger.warning(f"{label}: {path}")
+            if len(paths) > VERIFY_REPORT_LIMIT:
+                logger.warning(f"{label}: 另有 {len(paths) - VERIFY_REPORT_LIMIT} 个文件未列出")
+        
+        repaired = 0
+        if repair and (missing or modified) and target.generations and target.cache.get_meta("pending_commit"):
+            # 暂存目录中是未完成的同步，修复后切换会暴露不完整的一代
+            logger.warning(f"上次同步未完成，请先完成同步再修复: {target.live_path}")
+        elif repair and (missing or modified):
+            # 只修复缺失与被修改的文件，多余文件可能是用户自行添加的，保持不动；
+            # 分代模式下与同步相同，在暂存目录中修复后整体切换
+            if target.generations:
+                await self.stage_generation(target)
+            failed_before = target.failed
+            placements: Dict[str, List[Tuple[Dict, Path, SyncTarget]]] = {}
+            for file_path in missing + modified:
+                file_info = remote_files[file_path]
+                local_file_path = target.get_local_path(file_path)
+                # 就地修改的文件可能与对象库共享inode，对应对象已不可信
+                if local_file_path.exists():
+                    self.store.discard(file_info["sha"], self.get_stat_fingerprint(local_file_path))
+                placements.setdefault(file_info["sha"], []).append((file_info, local_file_path, target))
+            
+            await self.place_blobs(session, placements, set())
+            unrepaired = target.failed - failed_before
+            if target.failed:
+                # 有文件失败时提交标记不会写入
+                unrepaired += sum(1 for file_path in missing + modified
+                                  if file_path[len(prefix):] in COMMIT_MARKER_FILES)
+            elif target.generations and not await self.activate_generation(target):
+                unrepaired = len(missing) + len(modified)
+            repaired = len(missing) + len(modified) - unrepaired
+            logger.info(f"已修复 {repaired} 个文件")
+        
+        return {
+            "target": str(target.live_path),
+            "checked": len(remote_files),
+            "missing": missing,
+            "modified": modified,
+            "untracked": untracked,
+            "repaired": repaired,
+            "unrepaired": len(missing) + len(modified) - repaired
+        }
+    
+    def run_sync(self):
+        """运行同步（同步接口）"""
+        asyncio.run(self.sync_folder())
+
+    async def validate_token(self, session: aiohttp.ClientSession, token: str) -> bool:
+        """验证GitHub token是否有效"""
+        headers = {
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.v3+json",
+            "User-Agent": "GitHub-Folder-Sync"
+        }
+        
+        try:
+            # 使用简单的API调用测试token
+            url = f"{self.api_base}/user"
+            async with session.get(url, headers=headers) as response:
+                if response.status == 200:
+                    user_data = await response.json()
+                    logger.info(f"Token验证成功! 用户: {user_data.get('login', 'Unknown')}")
+                    return True
+                elif response.status == 401:
+                    logger.error("Token无效或已过期")
+                    return False
+                else:
+                    logger.error(f"Token验证失败，状态码: {response.status}")
+                    return False
+        except Exception as e:
+            logger.error(f"Token验证过程中出错: {e}")
+            return False
+
+class MirrorSnapshot:
+    """镜像对外提供的一个提交快照，由同步索引还原目录树"""
+    
+    def __init__(self, commit: str, files: Dict[str, Dict]):
+        self.commit = commit
+        self.files = files
+        
+        # 树SHA -> 直接子条目（名称 -> (类型, SHA, 大小)）
+        self.trees: Dict[str, Dict[str, Tuple[str, str, Optional[int]]]] = {}
+        
+        root: Dict = {}
+        for path, entry in files.items():
+            node = root
+            *directories, name = path.split("/")
+            for directory in directories:
+                node = node.setdefault(directory, {})
+            node[name] = (entry["sha"], entry["size"])
+        self.root_tree = self.hash_tree(root)
+    
+    def hash_tree(self, node: Dict) -> str:
+        """按git规则计算树SHA（文件模式均视为100644），相同内容的目录得到相同SHA"""
+        entries = {}
+        for name, child in node.items():
+            if isinstance(child, tuple):
+                entries[name] = ("blob", *child)
+            else:
+                entries[name] = ("tree", self.hash_tree(child), None)
+        
+        # git按名称排序，目录名视为带有结尾的 "/"
+        content = b"".join(
+            f"{'40000' if kind == 'tree' else '100644'} {name}".encode() + b"\0" + bytes.fromhex(sha)
+            for name, (kind, sha, _) in sorted(
+                entries.items(), key=lambda item: item[0] + "/" if item[1][0] == "tree" else item[0])
+        )
+        tree_sha = hashlib.sha1(b"tree %d\0" % len(content) + content).hexdigest()
+        self.trees[tree_sha] = entries
+        return tree_sha
+    
+    def list_tree(self, tree_sha: str, recursive: bool) -> List[Dict]:
+        """按Git Trees API的格式列出树条目"""
+        result = []
+        
+        def walk(sha: str, prefix: str):
+            for name, (kind, child_sha, size) in sorted(self.trees[sha].items()):
+                path = f"{prefix}{name}"
+                if kind == "tree":
+                    result.append({"path": path, "mode": "040000", "type": "tree", "sha": child_sha})
+                    if recursive:
+                        walk(child_sha, f"{path}/")
+                else:
+                    result.append({"path": path, "mode": "100644", "type": "blob",
+                                   "sha": child_sha, "size": size})
+        
+        walk(tree_sha, "")
+        return result
+
+class SyncMirror:
+    """局域网缓存镜像
+    
+    以GitHub API与raw下载的形式对外提供本机已完整同步的提交，文件内容直接从对象库或
+    资源目录流式发送；其他机器将 GITHUB_API_BASE、GITHUB_RAW_BASE 指向镜像后，
+    整个局域网每次更新只需向上游同步一次：
+    
+        GET /user
+        GET /repos/{owner}/{repo}/commits/{ref}
+        GET /repos/{owner}/{repo}/git/commits/{sha}
+        GET /repos/{owner}/{repo}/git/trees/{sha}[?recursive=1]
+        GET /repos/{owner}/{repo}/contents/{path}?ref={ref}
+        GET /repos/{owner}/{repo}/compare/{base}...{head}
+        GET /raw/{owner}/{repo}/{ref}/{path}
+    
+    未提供tarball接口，客户端的归档引导会失败并退回逐个下载
+    """
+    
+    def __init__(self, syncer: GitHubFolderSync):
+        self.syncer = syncer
+        self.snapshots: Dict[str, MirrorSnapshot] = {}
+        self.current: Optional[MirrorSnapshot] = None
+        
+        # 当前快照已生成的响应体，发布新提交时清空
+        self.bodies: Dict[Tuple, bytes] = {}
+    
+    def load_snapshot(self) -> Optional[MirrorSnapshot]:
+        """从主目标的同步索引构建快照（在工作线程中运行），同步未完成时返回None"""
+        target = self.syncer.targets[0]
+        index = SyncIndex(target.cache_file)
+        try:
+            commit = index.get_meta("last_commit")
+            if index.get_meta("pending_commit") or not commit:
+                return None
+            if self.current and self.current.commit == commit:
+                return None
+            return MirrorSnapshot(commit, index.entries(f"{self.syncer.target_folder}/"))
+        finally:
+            index.close()
+    
+    async def refresh(self):
+        """发布最新完整同步的提交，旧快照只保留有限个数"""
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, self.load_snapshot)
+        if snapshot is None:
+            return
+        
+        self.snapshots[snapshot.commit] = snapshot
+        while len(self.snapshots) > MIRROR_HISTORY:
+            self.snapshots.pop(next(iter(self.snapshots)))
+        self.current = snapshot
+        self.bodies.clear()
+        logger.info(f"镜像已发布提交 {snapshot.commit[:12]}: {len(snapshot.files)} 个文件")
+    
+    def add_routes(self, app: web.Application):
+        prefix = f"/repos/{self.syncer.repo_owner}/{self.syncer.repo_name}"
+        app.router.add_get("/user", self.handle_user)
+        app.router.add_get(f"{prefix}/commits/{{ref}}", self.handle_commit)
+        app.router.add_get(f"{prefix}/git/commits/{{sha}}", self.handle_git_commit)
+        app.router.add_get(f"{prefix}/git/trees/{{sha}}", self.handle_tree)
+        app.router.add_get(f"{prefix}/contents/{{path:.+}}", self.handle_contents)
+        app.router.add_get(f"{prefix}/compare/{{spec}}", self.handle_compare)
+        app.router.add_get(f"/raw/{self.syncer.repo_owner}/{self.syncer.repo_name}/{{ref}}/{{path:.+}}",
+                           self.handle_raw)
+    
+    def resolve(self, ref: str) -> MirrorSnapshot:
+        snapshot = self.current if ref == self.syncer.branch else self.snapshots.get(ref)
+        if snapshot is None:
+            raise web.HTTPNotFound(text=json.dumps({"message": "No commit found"}),
+                                   content_type="application/json")
+        return snapshot
+    
+    def respond(self, request: web.Request, body: bytes, etag: str,
+                content_type: str = "application/json") -> web.Response:
+        """带ETag的响应，客户端的条件请求命中时返回304"""
+        etag = f'"{etag}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type=content_type, headers={"ETag": etag})
+    
+    def blob_file(self, sha: str, path: str) -> Optional[Path]:
+        """定位blob内容：优先对象库，没有时（如不支持硬链接）退回资源目录中的文件，由客户端校验SHA"""
+        if self.syncer.store.has(sha):
+            return self.syncer.store.object_path(sha)
+        local_file_path = self.syncer.targets[0].get_local_path(path)
+        return local_file_path if local_file_path.is_file() else None
+    
+    async def handle_user(self, request: web.Request) -> web.Response:
+        return web.json_response({"login": "maa-mirror"})
+    
+    async def handle_commit(self, request: web.Request) -> web.Response:
+        snapshot = self.resolve(request.match_info["ref"])
+        if "sha" in request.headers.get("Accept", ""):
+            return self.respond(request, snapshot.commit.encode(), f"{snapshot.commit}-sha", "text/plain")
+        body = json.dumps({"sha": snapshot.commit, "commit": {"tree": {"sha": snapshot.root_tree}}})
+        return self.respond(request, body.encode(), snapshot.commit)
+    
+    async def handle_git_commit(self, request: web.Request) -> web.Response:
+        snapshot = self.resolve(request.match_info["sha"])
+        body = json.dumps({"sha": snapshot.commit, "tree": {"sha": snapshot.root_tree}})
+        return self.respond(request, body.encode(), snapshot.commit)
+    
+    async def handle_tree(self, request: web.Request) -> web.Response:
+        tree_sha = request.match_info["sha"]
+        recursive = bool(request.query.get("recursive"))
+        key = ("tree", tree_sha, recursive)
+        
+        if key not in self.bodies:
+            snapshot = next((s for s in [self.current, *self.snapshots.values()]
+                             if s is not None and tree_sha in s.trees), None)
+            if snapshot is None:
+                raise web.HTTPNotFound(text=json.dumps({"message": "Not Found"}),
+                                       content_type="application/json")
+            body = json.dumps({"sha": tree_sha, "tree": snapshot.list_tree(tree_sha, recursive),
+                               "truncated": False}).encode()
+            if snapshot is not self.current:
+                return self.respond(request, body, f"{tree_sha}-{int(recursive)}")
+            self.bodies[key] = body
+        
+        return self.respond(request, self.bodies[key], f"{tree_sha}-{int(recursive)}")
+    
+    async def handle_contents(self, request: web.Request) -> web.Response:
+        snapshot = self.resolve(request.query.get("ref", self.syncer.branch))
+        path = request.match_info["path"]
+        entry = snapshot.files.get(path)
+        file_path = self.blob_file(entry["sha"], path) if entry else None
+        if file_path is None:
+            raise web.HTTPNotFound(text=json.dumps({"message": "Not Found"}),
+                                   content_type="application/json")
+        if (entry["size"] or 0) > MIRROR_CONTENTS_LIMIT:
+            raise web.HTTPForbidden(text=json.dumps({"message": "File too large"}),
+                                    content_type="application/json")
+        
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, file_path.read_bytes)
+        body = json.dumps({
+            "type": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": entry["sha"],
+            "size": len(content),
+            "encoding": "base64",
+            "content": base64.b64encode(content).decode()
+        })
+        return self.respond(request, body.encode(), entry["sha"])
+    
+    async def handle_compare(self, request: web.Request) -> web.Response:
+        base_ref, _, head_ref = request.match_info["spec"].partition("...")
+        base = self.resolve(base_ref)
+        head = self.resolve(head_ref)
+        key = ("compare", base.commit, head.commit)
+        
+        if key not in self.bodies:
+            files = []
+            for path, entry in head.files.items():
+                previous = base.files.get(path)
+                if previous is None:
+                    files.append({"filename": path, "status": "added", "sha": entry["sha"]})
+                elif previous["sha"] != entry["sha"]:
+                    files.append({"filename": path, "status": "modified", "sha": entry["sha"]})
+            for path in base.files.keys() - head.files.keys():
+                files.append({"filename": path, "status": "removed", "sha": base.files[path]["sha"]})
+            
+            # 与GitHub一致，最多返回300个文件，客户端据此退回完整扫描
+            self.bodies[key] = json.dumps({
+                "status": "ahead" if files else "identical",
+                "files": files[:COMPARE_FILE_LIMIT]
+            }).encode()
+        
+        return self.respond(request, self.bodies[key], f"{base.commit}...{head.commit}")
+    
+    async def handle_raw(self, request: web.Request) -> web.StreamResponse:
+        snapshot = self.resolve(request.match_info["ref"])
+        path = request.match_info["path"]
+        entry = snapshot.files.get(path)
+        file_path = self.blob_file(entry["sha"], path) if entry else None
+        if file_path is None:
+            raise web.HTTPNotFound(text="404: Not Found")
+        
+        # 流式发送文件，不在内存中缓存内容
+        return web.FileResponse(file_path, headers={"Content-Type": "application/octet-stream"})
+
+class SyncDaemon:
+    """常驻模式
+    
+    复用同一个同步器与连接池，按带抖动的间隔轮询远程版本并在后台增量同步；
+    同时在本地提供HTTP接口，供MAA开始前脚本即时触发同步或查询是否已是最新：
+    
+        GET  /status           返回上次同步的状态
+        GET  /status?check=1   立即检查远程版本（通常是一次304请求）
+        POST /sync             执行一次同步并等待完成，?wait=0 时只触发不等待
+    
+    开启镜像时还会提供SyncMirror的GitHub兼容接口
+    """
+    
+    def __init__(self, syncer: GitHubFolderSync, interval: float = DAEMON_INTERVAL,
+                 jitter: float = DAEMON_JITTER, listen: str = DAEMON_LISTEN, mirror: bool = False):
+        self.syncer = syncer
+        self.mirror = SyncMirror(syncer) if mirror else None
+        self.interval = interval
+        self.jitter = jitter
+        self.host, _, port = listen.rpartition(":")
+        self.port = int(port)
+        self.lock: Optional[asyncio.Lock] = None
+        self.wake: Optional[asyncio.Event] = None
+        self.background_tasks: Set[asyncio.Task] = set()
+        self.status = {
+            "syncing": False,
+            "up_to_date": None,
+            "last_sync": None,
+            "last_success": None,
+            "last_error": None,
+            "commit": None,
+            "stats": {}
+        }
+    
+    async def sync_once(self):
+        """执行一轮同步，同一时间只会有一个同步在运行"""
+        async with self.lock:
+            self.status["syncing"] = True
+            self.syncer.reset_run_state()
+            try:
+                await self.syncer.sync_folder()
+                self.status["up_to_date"] = self.syncer.stats["failed"] == 0
+                self.status["last_success"] = self.status["up_to_date"]
+                self.status["last_error"] = None
+            except Exception as e:
+                logger.exception("常驻模式同步失败:")
+                self.status["up_to_date"] = False
+                self.status["last_success"] = False
+                self.status["last_error"] = str(e)
+            finally:
+                self.status["syncing"] = False
+                self.status["last_sync"] = datetime.now().isoformat()
+                self.status["commit"] = self.syncer.remote_commit or self.status["commit"]
+                self.status["stats"] = dict(self.syncer.stats)
+            
+            # 镜像只发布完整同步的提交
+            if self.mirror:
+                await self.mirror.refresh()
+    
+    async def handle_status(self, request: web.Request) -> web.Response:
+        # 检查会打开并关闭各目标的索引，必须持有同步锁，避免与同步同时进行；同步进行中时直接返回当前状态
+        if request.query.get("check") and not self.lock.locked():
+            async with self.lock:
+                try:
+                    self.status["up_to_date"] = await self.syncer.is_up_to_date(self.syncer.session)
+                except Exception as e:
+                    return web.json_response({**self.status, "last_error": str(e)}, status=502)
+        return web.json_response(self.status)
+    
+    async def manual_sync(self):
+        """手动触发的同步，完成后定时检查重新计时"""
+        await self.sync_once()
+        self.wake.set()
+    
+    async def handle_sync(self, request: web.Request) -> web.Response:
+        if request.query.get("wait") == "0":
+            task = asyncio.create_task(self.manual_sync())
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+            return web.json_response(self.status, status=202)
+        
+        await self.manual_sync()
+        return web.json_response(self.status, status=200 if self.status["last_success"] else 500)
+    
+    async def run(self):
+        self.lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+        self.syncer.session = self.syncer.create_session()
+        
+        app = web.Application()
+        app.router.add_get("/status", self.handle_status)
+        app.router.add_post("/sync", self.handle_sync)
+        if self.mirror:
+            self.mirror.add_routes(app)
+            await self.mirror.refresh()
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        logger.info(f"常驻模式已启动，监听 http://{self.host}:{self.port}，"
+                    f"每 {self.interval:.0f} 秒（±{self.jitter:.0%}）检查一次更新")
+        
+        try:
+            while True:
+                await self.sync_once()
+                
+                # 加入随机抖动，避免多台机器同时请求；期间有手动同步时重新计时
+                while True:
+                    delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        break
+                    self.wake.clear()
+        finally:
+            await runner.cleanup()
+            await self.syncer.session.close()
+            self.syncer.session = None
+
+async def sync(config: SyncConfig, on_event: Optional[Callable[[SyncEvent], None]] = None) -> SyncResult:
+    """以库的方式执行一次同步
+    
+    不读取.env或环境变量，也不会交互式询问token：token无效时抛出 GitHubRequestError（status为401）。
+    每次调用使用独立的同步器与会话，可在同一事件循环中并发同步不同的仓库或分支（目标目录不能重叠）
+    """
+    syncer = GitHubFolderSync.from_config(config, on_event)
+    start = time.perf_counter()
+    try:
+        await syncer.sync_folder()
+    finally:
+        syncer.hash_executor.shutdown(wait=False)
+    return syncer.build_result(time.perf_counter() - start)
+
+async def sync_events(config: SyncConfig) -> AsyncIterator[SyncEvent]:
+    """以异步迭代器的形式产出同步进度事件，最后一个事件为 SyncFinished；同步出错时在迭代中抛出"""
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(sync(config, queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+        yield SyncFinished(task.result())
+    finally:
+        # 调用方提前停止迭代时取消同步
+        if not task.done():
+            task.cancel()
+
+def load_env_file():
+    """加载.env文件"""
+    env_path = Path(".env")
+    if env_path.exists():
+        load_dotenv(env_path)
+    return env_path
+
+def split_env_list(name: str) -> List[str]:
+    """读取以逗号分隔的环境变量"""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+def save_token_to_env(token: str, env_path: Path):
+    """保存token到.env文件"""
+    try:
+        # 如果.env文件不存在，创建它
+        if not env_path.exists():
+            env_path.touch()
+            logger.info("创建了新的.env文件")
+        
+        # 使用python-dotenv的set_key函数安全地设置环境变量
+        set_key(env_path, "GITHUB_TOKEN", token)
+        logger.info("Token已保存到.env文件")
+        
+        # 同时设置到当前环境中
+        os.environ["GITHUB_TOKEN"] = token
+        
+    except Exception as e:
+        logger.error(f"保存token到.env文件失败: {e}")
+
+def token_fingerprint(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def load_token_cache(token: str) -> Optional[Dict]:
+    """读取该token上次成功使用时记录的限流余量，记录的不是该token时返回None"""
+    try:
+        cache = json.loads(Path(TOKEN_CACHE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return cache if cache.get("token") == token_fingerprint(token) else None
+
+def save_token_cache(token: str, metrics: Optional[SyncMetrics] = None):
+    """记录token已被GitHub接受，以及最近一次响应中的限流余量（已知时）"""
+    cache = {
+        "token": token_fingerprint(token),
+        "checked": datetime.now().isoformat(),
+        "rate_limit": {
+            "limit": metrics.rate_limit if metrics else None,
+            "remaining": metrics.rate_remaining if metrics else None
+        }
+    }
+    try:
+        Path(TOKEN_CACHE_FILE).write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"保存token缓存失败: {e}")
+
+def get_valid_token(prompt: bool = False, revalidate: bool = False) -> str:
+    """获取有效的GitHub token
+    
+    已保存的token曾被GitHub接受（记录在token缓存中）时不再请求/user验证，之后被撤销时由第一次
+    实际的API请求返回401发现，再以prompt=True调用；revalidate表示忽略缓存重新验证（常驻模式启动时）
+    """
+    # 加载.env文件
+    env_path = load_env_file()
+    
+    # 首先尝试从环境变量获取
+    token = os.getenv("GITHUB_TOKEN")
+    
+    async def validate_token_async(token: str) -> bool:
+        """异步验证token的包装函数"""
+        syncer_temp = GitHubFolderSync(token, api_base=os.getenv("GITHUB_API_BASE", DEFAULT_API_BASE))
+        async with aiohttp.ClientSession() as session:
+            return await syncer_temp.validate_token(session, token)
+    
+    if token and not prompt:
+        cache = load_token_cache(token)
+        if cache and not revalidate:
+            if cache["rate_limit"]["remaining"] == 0:
+                print("上次运行时API额度已用尽，本次可能需要等待额度重置")
+            return token
+        
+        print("发现现有token，正在验证...")
+        try:
+            if asyncio.run(validate_token_async(token)):
+                save_token_cache(token)
+                return token
+            print("现有token无效，需要输入新的token")
+        except Exception as e:
+            print(f"验证token时出错: {e}")
+    
+    # 循环直到获得有效token
+    while True:
+        token = input("请输入您的GitHub Personal Access Token: ").strip()
+        
+        if not token:
+            print("错误: Token不能为空")
+            continue
+        
+        print("正在验证token...")
+        try:
+            is_valid = asyncio.run(validate_token_async(token))
+            if is_valid:
+                # 询问是否保存到.env文件
+                save_choice = input("是否将token保存到.env文件？(y/n，默认为y): ").strip().lower()
+                if save_choice != 'n':
+                    save_token_to_env(token, env_path)
+                    save_token_cache(token)
+                return token
+            else:
+                print("Token无效，请检查并重新输入")
+        except Exception as e:
+            print(f"验证token时出错: {e}")
+            print("请重新输入token")
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="MAA Resource Updater")
+    subparsers = parser.add_subparsers(dest="command")
+    verify = subparsers.add_parser("verify", help="校验本地文件与远程清单是否一致")
+    verify.add_argument("--repair", action="store_true", help="重新下载缺失与被修改的文件")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常驻模式：复用连接池定时同步，并提供本地HTTP接口")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL,
+                        help=f"常驻模式的轮询间隔（秒，默认 {DAEMON_INTERVAL}）")
+    parser.add_argument("--jitter", type=float, default=DAEMON_JITTER,
+                        help=f"轮询间隔的随机抖动比例（默认 {DAEMON_JITTER}）")
+    parser.add_argument("--listen", default=DAEMON_LISTEN,
+                        help=f"常驻模式的本地监听地址（默认 {DAEMON_LISTEN}）")
+    parser.add_argument("--mirror", action="store_true",
+                        help="局域网镜像模式（隐含 --daemon）：向其他机器提供已同步的提交，需配合 --listen 0.0.0.0:端口")
+    parser.add_argument("--target", action="append", default=[], metavar="PATH",
+                        help="同时更新的其他MAA resource目录，可重复；共用一次远程扫描与下载")
+    parser.add_argument("--generations", action="store_true",
+                        help="分代模式：在暂存目录中构建新版本后整体切换，保留上一版本")
+    parser.add_argument("--rollback", action="store_true",
+                        help="切换回分代模式保留的上一版本后退出")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="只同步匹配的路径（相对resource目录，如 global/YoStarEN），可重复")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="不同步也不删除匹配的路径（如 global/txwy），可重复")
+    return parser.parse_args()
+
+def run_with_token_retry(syncer: GitHubFolderSync, action):
+    """执行需要访问API的操作，token被拒绝（401）时重新输入token后再执行一次"""
+    try:
+        return action()
+    except GitHubRequestError as e:
+        if e.status != 401:
+            raise
+        print("Token无效或已过期，需要输入新的token")
+        syncer.set_token(get_valid_token(prompt=True))
+        return action()
+
+def main():
+    """主函数"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    
+    print("MAA Resource Updater")
+    print("=" * 40)
+    
+    # 回滚只涉及本地目录，不需要token
+    if args.rollback:
+        for target_path in ["./resource", *args.target]:
+            try:
+                SyncTarget(Path(target_path), "resource", generations=True).rollback()
+            except Exception as e:
+                print(f"回滚失败: {e}")
+        return
+    
+    # 获取有效token
+    token_start = time.perf_counter()
+    try:
+        # 常驻模式无法在运行中重新输入token，启动前总是验证一次
+        token = get_valid_token(revalidate=args.daemon or args.mirror)
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+        return
+    except Exception as e:
+        print(f"获取token时发生错误: {e}")
+        if args.command == "verify":
+            sys.exit(1)
+        return
+    
+    # 设置本地存储路径
+    # local_path = input("请输入本地存储路径 (默认: ./resource): ").strip()
+    # if not local_path:
+        # local_path = "./resource"
+    local_path = "./resource"
+
+    # 创建同步器并运行
+    syncer = GitHubFolderSync(
+        token,
+        local_path,
+        api_base=os.getenv("GITHUB_API_BASE", DEFAULT_API_BASE),
+        raw_base=os.getenv("GITHUB_RAW_BASE", DEFAULT_RAW_BASE),
+        metrics_dir=os.getenv("SYNC_METRICS_DIR"),
+        targets=args.target,
+        include=args.include or split_env_list("SYNC_INCLUDE"),
+        exclude=args.exclude or split_env_list("SYNC_EXCLUDE"),
+        generations=args.generations
+    )
+    syncer.metrics.phases["token_check"] = time.perf_counter() - token_start
+    
+    # 镜像提供的目录树必须完整，否则客户端会删除未同步的文件
+    if args.mirror and syncer.path_filter.active:
+        print("镜像模式不能与路径过滤同时使用")
+        return
+    
+    try:
+        if args.command == "verify":
+            reports = run_with_token_retry(syncer, lambda: asyncio.run(syncer.verify_folder(args.repair)))
+            save_token_cache(syncer.token, syncer.metrics)
+            # 仍有未修复的问题时以非零状态退出，便于脚本判断
+            if any(report["unrepaired"] for report in reports):
+                sys.exit(1)
+        elif args.daemon or args.mirror:
+            asyncio.run(SyncDaemon(syncer, args.interval, args.jitter, args.listen, args.mirror).run())
+        else:
+            # 无需更新时只发一次请求，也不加载aiohttp
+            run_with_token_retry(syncer, lambda: syncer.check_up_to_date_quick() or syncer.run_sync())
+            save_token_cache(syncer.token, syncer.metrics)
+    except KeyboardInterrupt:
+        print("\n同步被用户中断")
+    except Exception as e:
+        print(f"同步过程中发生错误: {e}")
+        logger.exception("详细错误信息:")
+        # 校验未能完成时同样以非零状态退出
+        if args.command == "verify":
+            sys.exit(1)
+
+if __name__ == "__main__":
+    # 打包为可执行文件时，校验模式的进程池需要
+    multiprocessing.freeze_support()
+    main()
\ No newline at end of file